@@ -1,127 +1,69 @@
-
-import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from datetime import datetime
 import collections
-import random
-
-def analyze_taste_profile(audio_features_df, genres, top_artists):
-    """Generate personalized taste profile and insights based on audio features and genres."""
-    # Initialize result dictionary
-    profile = {
-        'insights': [],
-        'personality_traits': []
-    }
-    
-    # Skip if no data
-    if audio_features_df.empty or not genres:
-        return profile
-    
-    # Extract mean values for key features
-    mean_danceability = audio_features_df['danceability'].mean()
-    mean_energy = audio_features_df['energy'].mean()
-    mean_valence = audio_features_df['valence'].mean()
-    mean_tempo = audio_features_df['tempo'].mean()
-    mean_acousticness = audio_features_df['acousticness'].mean()
-    
-    # Generate insights based on audio features
-    # Danceability insights
-    if mean_danceability > 0.7:
-        profile['insights'].append("You gravitate toward rhythmic, danceable music that keeps you moving.")
-        profile['personality_traits'].append("Dance Enthusiast")
-    elif mean_danceability < 0.4:
-        profile['insights'].append("You prefer music with complex, less predictable rhythmic structures.")
-        profile['personality_traits'].append("Rhythm Explorer")
-    
-    # Energy insights
-    if mean_energy > 0.7:
-        profile['insights'].append("High-energy tracks dominate your playlist, suggesting you use music for motivation.")
-        profile['personality_traits'].append("Energy Seeker")
-    elif mean_energy < 0.4:
-        profile['insights'].append("You tend to enjoy more relaxed, calming music that creates atmosphere.")
-        profile['personality_traits'].append("Ambience Lover")
-    
-    # Mood (valence) insights
-    if mean_valence > 0.7:
-        profile['insights'].append("Your music choices reflect a preference for uplifting, positive sounds.")
-        profile['personality_traits'].append("Positivity Seeker")
-    elif mean_valence < 0.4:
-        profile['insights'].append("You're drawn to more melancholic, reflective, and emotionally complex music.")
-        profile['personality_traits'].append("Emotional Depth Explorer")
-    
-    # Tempo insights
-    if mean_tempo > 120:
-        profile['insights'].append("Fast-paced music features prominently in your listening habits.")
-    elif mean_tempo < 90:
-        profile['insights'].append("You tend to enjoy music with a more leisurely, relaxed pace.")
-    
-    # Acousticness insights
-    if mean_acousticness > 0.6:
-        profile['insights'].append("Acoustic elements and organic instruments resonate strongly with you.")
-        profile['personality_traits'].append("Acoustic Enthusiast")
-    elif mean_acousticness < 0.3:
-        profile['insights'].append("You prefer contemporary production with electronic and processed sounds.")
-        profile['personality_traits'].append("Production Enthusiast")
-    
-    # Genre insights
-    top_genres = [g[0] for g in genres[:3]] if genres else []
-    if top_genres:
-        profile['insights'].append(f"Your top genres ({', '.join(top_genres)}) reveal a taste for {random.choice(['diverse', 'distinctive', 'characteristic'])} musical styles.")
-    
-    # Shuffle insights to create variety
-    random.shuffle(profile['insights'])
-    
-    return profile
+import contextlib
+from clustering import CLUSTER_FEATURES, get_cluster_engine
+from timeline import ListeningTimeline
+from features import FeatureSummary, FEATURE_DEFAULTS, build_feature_frame, summarize_features
+from memo import memoize
+from chart_data import build_history_chart_data, play_feature_matrix
+
+def feature_key(audio_features_df, *args, **kwargs):
+    """Memo key of an analysis of the feature table.
+
+    Track codes are local to the process and the feature summary is derived
+    from the table, so both are left out.
+    """
+    args = [arg for arg in args if not isinstance(arg, FeatureSummary)]
+    kwargs.pop('feature_summary', None)
+    columns = [column for column in audio_features_df.columns if column != 'track_code']
+    return columns, [audio_features_df[column].to_numpy() for column in columns], args, kwargs
+
+def timeline_key(recent_tracks, timeline=None):
+    """Memo key of the listening trends: the timeline's counts, or the raw plays without one."""
+    if timeline is None:
+        return recent_tracks
+    return timeline.hour_weekday_counts, timeline.session_plays, timeline.session_minutes
 
+def artist_genres(artist_index):
+    """Get the part of an artist index the analysis reads: each artist's genres, by id."""
+    if artist_index is None:
+        return None
+    return sorted((artist_id, details.get('genres') or []) for artist_id, details in artist_index.items())
+
+def genre_key(track_lists, artist_index):
+    """Memo key of a genre distribution, leaving out when each artist was fetched."""
+    return track_lists, artist_genres(artist_index)
+
+
+# Track codes are process-local, so the table is only kept in memory
+@memoize()
 def process_audio_features(audio_features):
-    """Process the audio features data and convert to a DataFrame."""
+    """Process the audio features data into the compact feature table."""
     try:
         if not audio_features:
-            # Return a dummy dataframe with default values if no data
-            return pd.DataFrame({
-                'danceability': [0.5], 'energy': [0.5], 'key': [0], 
-                'loudness': [-10], 'speechiness': [0.1], 'acousticness': [0.5],
-                'instrumentalness': [0.1], 'liveness': [0.1], 'valence': [0.5],
-                'tempo': [120], 'duration_ms': [200000]
-            })
-        
-        # Clean None values
-        audio_features = [af for af in audio_features if af is not None]
-        
-        # Create DataFrame
-        df = pd.DataFrame(audio_features)
+            # Return a single row of default values if no data
+            return build_feature_frame([FEATURE_DEFAULTS])
         
-        # Fill any missing values
-        df = df.fillna({
-            'danceability': 0.5, 'energy': 0.5, 'key': 0, 
-            'loudness': -10, 'speechiness': 0.1, 'acousticness': 0.5,
-            'instrumentalness': 0.1, 'liveness': 0.1, 'valence': 0.5,
-            'tempo': 120, 'duration_ms': 200000
-        })
-        
-        return df
+        return build_feature_frame(audio_features)
     except Exception as e:
-        # Return a dummy dataframe with default values if error
-        return pd.DataFrame({
-            'danceability': [0.5], 'energy': [0.5], 'key': [0], 
-            'loudness': [-10], 'speechiness': [0.1], 'acousticness': [0.5],
-            'instrumentalness': [0.1], 'liveness': [0.1], 'valence': [0.5],
-            'tempo': [120], 'duration_ms': [200000]
-        })
+        # Return a single row of default values if error
+        return build_feature_frame([FEATURE_DEFAULTS])
 
-def analyze_mood(audio_features_df):
+@memoize(disk=True, key=feature_key)
+def analyze_mood(audio_features_df, feature_summary=None):
     """Analyze mood based on audio features."""
     try:
+        summary = summarize_features(audio_features_df, feature_summary)
+
         # Calculate mood metrics
-        valence = audio_features_df['valence'].mean()
-        energy = audio_features_df['energy'].mean()
-        danceability = audio_features_df['danceability'].mean()
+        valence = summary.mean('valence')
+        energy = summary.mean('energy')
+        danceability = summary.mean('danceability')
         
         # Determine mood diversity
         mood_diversity_score = round(
-            (audio_features_df['valence'].std() + 
-             audio_features_df['energy'].std()) * 100, 
+            (summary.std('valence') + 
+             summary.std('energy')) * 100, 
             2
         )
         
@@ -159,6 +101,7 @@ def get_mood_label(valence, energy):
     else:
         return "Balanced"
 
+@memoize(disk=True)
 def get_genre_distribution(top_artists):
     """Get genre distribution from top artists."""
     try:
@@ -185,10 +128,33 @@ def get_genre_distribution(top_artists):
         return [("Pop", 5), ("Rock", 4), ("Hip-Hop", 3), 
                ("Electronic", 2), ("Jazz", 1)]
 
-def calculate_listening_trends(recent_tracks):
+@memoize(disk=True, key=genre_key)
+def get_listened_genre_distribution(track_lists, artist_index):
+    """Get genre distribution over every listened track's artists."""
+    try:
+        genre_counts = collections.Counter()
+        for tracks in track_lists:
+            if not tracks or 'items' not in tracks:
+                continue
+            for item in tracks['items']:
+                # History items wrap the track; top-track items are the track itself
+                track = item.get('track', item)
+                for artist in track.get('artists', []):
+                    details = artist_index.get(artist.get('id'))
+                    if details:
+                        genre_counts.update(details['genres'])
+
+        return genre_counts.most_common()
+    except Exception as e:
+        return []
+
+@memoize(disk=True, key=timeline_key)
+def calculate_listening_trends(recent_tracks, timeline=None):
     """Calculate listening trends from recent tracks."""
     try:
-        if not recent_tracks or 'items' not in recent_tracks:
+        if timeline is None:
+            timeline = ListeningTimeline.from_recent_tracks(recent_tracks)
+        if not len(timeline):
             # Return default values if no data
             return {
                 'peak_hour': 20,
@@ -196,33 +162,14 @@ def calculate_listening_trends(recent_tracks):
                 'favorite_day': 'Saturday'
             }
         
-        # Extract timestamps
-        timestamps = [item['played_at'] for item in recent_tracks['items']]
-        
-        # Convert timestamps to datetime objects
-        datetimes = [datetime.fromisoformat(ts.replace('Z', '+00:00')) 
-                     if 'Z' in ts else datetime.fromisoformat(ts) 
-                     for ts in timestamps]
-        
-        # Extract hour of day and day of week
-        hours = [dt.hour for dt in datetimes]
-        days = [dt.strftime('%A') for dt in datetimes]
-        
-        # Find peak hour
-        hour_counts = collections.Counter(hours)
-        peak_hour = hour_counts.most_common(1)[0][0]
-        
-        # Find favorite day
-        day_counts = collections.Counter(days)
-        favorite_day = day_counts.most_common(1)[0][0]
-        
-        # Estimate listening sessions (simplistic)
-        listening_sessions = len(recent_tracks['items'])
-        
         return {
-            'peak_hour': peak_hour,
-            'listening_sessions': listening_sessions,
-            'favorite_day': favorite_day
+            'peak_hour': timeline.peak_hour(),
+            # Runs of plays separated by long gaps
+            'listening_sessions': timeline.session_count,
+            'favorite_day': timeline.favorite_day(),
+            'average_session_plays': round(float(timeline.session_plays.mean()), 1),
+            'average_session_minutes': round(float(timeline.session_minutes.mean()), 1),
+            'hour_weekday_counts': timeline.hour_weekday_counts
         }
     except Exception as e:
         # Return default values if error
@@ -232,28 +179,31 @@ def calculate_listening_trends(recent_tracks):
             'favorite_day': 'Saturday'
         }
 
-def analyze_music_patterns(audio_features_df):
+@memoize(disk=True, key=feature_key)
+def analyze_music_patterns(audio_features_df, feature_summary=None):
     """Analyze complex music patterns and characteristics."""
     try:
+        summary = summarize_features(audio_features_df, feature_summary)
+
         # Calculate temporal patterns
         tempo_patterns = {
-            'avg_tempo': audio_features_df['tempo'].mean(),
-            'tempo_variation': audio_features_df['tempo'].std(),
-            'tempo_range': audio_features_df['tempo'].max() - audio_features_df['tempo'].min()
+            'avg_tempo': summary.mean('tempo'),
+            'tempo_variation': summary.std('tempo'),
+            'tempo_range': summary.max('tempo') - summary.min('tempo')
         }
         
         # Analyze acoustic vs electronic balance
         acoustic_electronic_ratio = (
-            audio_features_df['acousticness'].mean() / 
-            max(0.01, 1 - audio_features_df['instrumentalness'].mean())  # Avoid division by zero
+            summary.mean('acousticness') / 
+            max(0.01, 1 - summary.mean('instrumentalness'))  # Avoid division by zero
         )
         
         return {
             'tempo_patterns': tempo_patterns,
             'acoustic_electronic_ratio': round(acoustic_electronic_ratio, 2),
             'complexity_score': round(
-                (audio_features_df['instrumentalness'].mean() + 
-                 audio_features_df['speechiness'].std()) * 100, 
+                (summary.mean('instrumentalness') + 
+                 summary.std('speechiness')) * 100, 
                 2
             )
         }
@@ -269,15 +219,18 @@ def analyze_music_patterns(audio_features_df):
             'complexity_score': 50
         }
 
-def analyze_taste_profile(audio_features_df, top_genres, top_artists):
+@memoize(disk=True, key=feature_key)
+def analyze_taste_profile(audio_features_df, top_genres, top_artists, feature_summary=None):
     """Generate detailed analysis of user's taste profile with specific comments."""
     try:
+        summary = summarize_features(audio_features_df, feature_summary)
+
         # Analyze key characteristics
-        avg_danceability = audio_features_df['danceability'].mean()
-        avg_energy = audio_features_df['energy'].mean()
-        avg_valence = audio_features_df['valence'].mean()
-        avg_acousticness = audio_features_df['acousticness'].mean()
-        avg_instrumentalness = audio_features_df['instrumentalness'].mean()
+        avg_danceability = summary.mean('danceability')
+        avg_energy = summary.mean('energy')
+        avg_valence = summary.mean('valence')
+        avg_acousticness = summary.mean('acousticness')
+        avg_instrumentalness = summary.mean('instrumentalness')
         
         # Generate insights based on these values
         insights = []
@@ -355,61 +308,70 @@ def analyze_taste_profile(audio_features_df, top_genres, top_artists):
             'personality_traits': ["The Balanced Listener"]
         }
 
-def cluster_tracks(audio_features_df):
-    """Use K-means clustering to group tracks by audio features."""
-    try:
-        # Select features for clustering
-        features = ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness']
-        X = audio_features_df[features].values
-        
-        # Determine optimal number of clusters (simplified)
-        n_clusters = min(3, len(X))
-        
-        # Perform K-means clustering
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        clusters = kmeans.fit_predict(X)
-        
-        # Get cluster centers
-        centers = kmeans.cluster_centers_
-        
-        # Assign mood labels to clusters
-        cluster_moods = []
-        for center in centers:
-            # Unpack center values based on the order of features
-            dance, energy, valence, acoustic, instrument = center
-            
+def describe_clusters(centers, counts):
+    """Label cluster centers with moods and characteristics."""
+    total = counts.sum()
+    result = []
+    for i, center in enumerate(centers):
+        if not counts[i]:
+            continue
+
+        # Unpack center values based on the order of features
+        dance, energy, valence, acoustic, instrument = center
+        
+        # Add additional characteristics
+        characteristics = []
+        if dance > 0.7:
+            characteristics.append("Danceable")
+        if acoustic > 0.6:
+            characteristics.append("Acoustic")
+        elif instrument > 0.6:
+            characteristics.append("Instrumental")
+        
+        result.append({
+            'cluster_id': i,
+            'count': int(counts[i]),
+            'percentage': round(float(counts[i] / total) * 100, 1),
             # Determine mood based on valence and energy
-            mood = get_mood_label(valence, energy)
-            
-            # Add additional characteristics
-            characteristics = []
-            if dance > 0.7:
-                characteristics.append("Danceable")
-            if acoustic > 0.6:
-                characteristics.append("Acoustic")
-            elif instrument > 0.6:
-                characteristics.append("Instrumental")
-            
-            cluster_moods.append({
-                'mood': mood,
-                'characteristics': characteristics
-            })
-        
-        # Count tracks in each cluster
-        cluster_counts = collections.Counter(clusters)
-        
-        result = []
-        for i in range(n_clusters):
-            if i in cluster_counts:
-                result.append({
-                    'cluster_id': i,
-                    'count': cluster_counts[i],
-                    'percentage': round((cluster_counts[i] / len(clusters)) * 100, 1),
-                    'mood': cluster_moods[i]['mood'],
-                    'characteristics': cluster_moods[i]['characteristics']
-                })
-        
-        return result
+            'mood': get_mood_label(valence, energy),
+            'characteristics': characteristics,
+            'center': [float(value) for value in center]
+        })
+    
+    return result
+
+@memoize(disk=True, key=feature_key)
+def cluster_features(audio_features_df):
+    """Cluster the given tracks one-shot with KMeans."""
+    # scikit-learn takes seconds to import, so it's loaded on first use
+    from sklearn.cluster import KMeans
+
+    # Select features for clustering
+    X = audio_features_df[CLUSTER_FEATURES].values
+    
+    # Determine optimal number of clusters (simplified)
+    n_clusters = min(3, len(X))
+    
+    # Perform K-means clustering
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+    clusters = kmeans.fit_predict(X)
+    
+    return describe_clusters(kmeans.cluster_centers_, np.bincount(clusters, minlength=n_clusters))
+
+def cluster_tracks(audio_features_df, user_id=None, history_features_df=None):
+    """Group tracks by audio features.
+
+    With a user id, the user's persistent cluster model is updated with any
+    tracks it hasn't seen and describes their whole history; otherwise (and
+    while a user has too few tracks) the given tracks are clustered one-shot.
+    """
+    try:
+        if user_id:
+            clusters = get_cluster_engine().update(user_id, [audio_features_df, history_features_df])
+            if clusters is not None:
+                return describe_clusters(*clusters)
+
+        return cluster_features(audio_features_df)
     except Exception as e:
         # Return default values if error
         return [
@@ -428,3 +390,119 @@ def cluster_tracks(audio_features_df):
                 'characteristics': ['Acoustic']
             }
         ]
+
+def get_history_features(data):
+    """Get audio features by track id for the listening history.
+
+    Combines the fetched features with those the fetch found in the shared
+    feature store for history tracks loaded earlier.
+    """
+    return {
+        features.get('id'): features
+        for key in ('audio_features', 'history_features', 'stored_history_features')
+        for features in data.get(key) or []
+        if features and features.get('id')
+    }
+
+def item_ids(items):
+    """Get the ids of API objects, e.g. top tracks or audio features, in order."""
+    return [item.get('id') if item else None for item in items or []]
+
+def history_fingerprint(recent_tracks):
+    """Identify a listening history by its play count and its newest and oldest plays.
+
+    Stored history only grows at the newest end and its window only drops
+    plays from the oldest, so these pin the plays down without reading them all.
+    """
+    items = recent_tracks['items'] if recent_tracks and 'items' in recent_tracks else []
+    if not items:
+        return 0, None, None
+    return len(items), items[0]['played_at'], items[-1]['played_at']
+
+def dashboard_key(data, tz=None, timer=None):
+    """Memo key of a dashboard analysis: cheap fingerprints of each input.
+
+    Hashing the full data would cost more with every play stored, so
+    responses are identified by their item ids (a track's audio features
+    never change), artists by their genres, and the history by
+    history_fingerprint. Which response a history track's features arrived
+    in varies with the cluster model's state, so those are keyed together.
+    """
+    return {
+        'audio_features': item_ids(data.get('audio_features')),
+        'history_features': sorted(get_history_features(data)),
+        'top_tracks': item_ids((data.get('top_tracks') or {}).get('items')),
+        'top_artists': item_ids((data.get('top_artists') or {}).get('items')),
+        'recent_tracks': history_fingerprint(data.get('recent_tracks')),
+        'artist_index': artist_genres(data.get('artist_index')),
+        'user_id': data.get('user_id')
+    }, tz
+
+def untimed(stage):
+    return contextlib.nullcontext()
+
+@memoize(key=dashboard_key)
+def analyze_dashboard(data, tz=None, timer=None):
+    """Run every dashboard analysis over fetched (or simulated) data.
+
+    Listening times are bucketed in the given timezone (UTC by default).
+    Reruns over unchanged data reuse the whole result, including the clusters
+    as they were when the data was first analyzed. timer, if given, is an
+    object whose time(stage) context manager wraps each stage, e.g. the load
+    generator's StageTimer.
+    """
+    stage = timer.time if timer is not None else untimed
+
+    with stage("process_audio_features"):
+        audio_features_df = process_audio_features(data['audio_features'])
+    with stage("summarize_features"):
+        # Column statistics are computed once and shared by every analysis and chart
+        feature_summary = FeatureSummary.from_frame(audio_features_df)
+    with stage("analyze_mood"):
+        mood_analysis = analyze_mood(audio_features_df, feature_summary)
+    with stage("analyze_music_patterns"):
+        music_patterns = analyze_music_patterns(audio_features_df, feature_summary)
+
+    with stage("genre_distribution"):
+        # Cover every listened track when artist genres were resolved
+        genres = []
+        if data.get('artist_index'):
+            genres = get_listened_genre_distribution(
+                [data['top_tracks'], data['recent_tracks']], data['artist_index']
+            )
+        if not genres:
+            genres = get_genre_distribution(data['top_artists'])
+
+    with stage("calculate_listening_trends"):
+        # Play times are parsed once for the trends and the listening-time chart
+        listening_timeline = ListeningTimeline.from_recent_tracks(data['recent_tracks'], tz)
+        listening_trends = calculate_listening_trends(data['recent_tracks'], listening_timeline)
+
+    with stage("history_chart_data"):
+        # Fixed-size aggregates of the whole history for the history charts
+        history_chart_data = build_history_chart_data(
+            listening_timeline, play_feature_matrix(data['recent_tracks'], get_history_features(data))
+        )
+
+    with stage("cluster_tracks"):
+        # Listened tracks the user's cluster model hasn't seen yet
+        history_features_df = None
+        if data.get('history_features'):
+            history_features_df = process_audio_features(data['history_features'])
+        track_clusters = cluster_tracks(audio_features_df, data.get('user_id'), history_features_df)
+
+    with stage("analyze_taste_profile"):
+        taste_profile = analyze_taste_profile(audio_features_df, genres, data['top_artists'], feature_summary)
+
+    return {
+        'audio_features_df': audio_features_df,
+        'feature_summary': feature_summary,
+        'mood_analysis': mood_analysis,
+        'music_patterns': music_patterns,
+        'genres': genres,
+        'listening_timeline': listening_timeline,
+        'listening_trends': listening_trends,
+        'history_chart_data': history_chart_data,
+        'track_clusters': track_clusters,
+        'taste_profile': taste_profile
+    }
@@ -0,0 +1,449 @@
+import os
+import time
+import asyncio
+import threading
+import httpx
+import requests
+import streamlit as st
+from spotipy.exceptions import SpotifyException
+from cache import get_response_cache, get_audio_feature_store, get_artist_store, ResponseCache
+from scheduler import get_scheduler, FOREGROUND, BACKGROUND
+from history import get_history_store
+from spotify_client import (
+    SPOTIFY_API_BASE, HISTORY_SYNC_INTERVAL, HISTORY_MAX_PLAYS, ARTIST_MAX_AGE, history_window_start,
+    build_recommendation_params, recommendation_cache_params, extract_top_albums, collect_artist_ids,
+    remember_artists, remember_top_artists, get_stored_history_features, add_recommendation_candidates,
+    get_user_id as get_sync_user_id
+)
+
+# Serve dashboard loads from the shared event loop instead of per-session threads
+ASYNC_BACKEND_ENABLED = os.getenv("LATIDO_ASYNC_BACKEND", "0") == "1"
+
+class AsyncSpotify:
+    """Asyncio Spotify Web API client for the endpoints the dashboard uses.
+
+    Mirrors the spotipy methods spotify_client.py calls, so the async getters
+    below read the same as their blocking counterparts. Every instance shares
+    one pooled HTTP client on the backend event loop; only the token differs.
+    The access token is resolved before the client is handed to the loop,
+    since refreshing it is a blocking call.
+    """
+
+    def __init__(self, access_token, user_id=None):
+        self.access_token = access_token
+        self.user_id = user_id
+
+    async def _get(self, path, params=None):
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        headers = {'Authorization': f"Bearer {self.access_token}"}
+        try:
+            response = await get_http_client().get(SPOTIFY_API_BASE + path, params=params, headers=headers)
+        except httpx.TransportError as e:
+            # Surface the same error types as spotipy so the scheduler retries them
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        if response.status_code >= 400:
+            try:
+                message = response.json()['error']['message']
+            except Exception:
+                message = response.text
+            raise SpotifyException(
+                response.status_code, -1, f"{response.url}:\n {message}",
+                headers=dict(response.headers)
+            )
+        return response.json() if response.content else None
+
+    async def current_user(self):
+        return await self._get('me')
+
+    async def current_user_top_tracks(self, limit=20, offset=0, time_range='medium_term'):
+        return await self._get('me/top/tracks', {'limit': limit, 'offset': offset, 'time_range': time_range})
+
+    async def current_user_top_artists(self, limit=20, offset=0, time_range='medium_term'):
+        return await self._get('me/top/artists', {'limit': limit, 'offset': offset, 'time_range': time_range})
+
+    async def current_user_recently_played(self, limit=50, after=None, before=None):
+        return await self._get('me/player/recently-played', {'limit': limit, 'after': after, 'before': before})
+
+    async def audio_features(self, tracks):
+        response = await self._get('audio-features', {'ids': ",".join(tracks)})
+        return response['audio_features'] if response else None
+
+    async def artists(self, artists):
+        return await self._get('artists', {'ids': ",".join(artists)})
+
+    async def recommendations(self, seed_artists=None, seed_tracks=None, limit=20, **kwargs):
+        params = dict(kwargs, limit=limit)
+        if seed_artists:
+            params['seed_artists'] = ",".join(seed_artists)
+        if seed_tracks:
+            params['seed_tracks'] = ",".join(seed_tracks)
+        return await self._get('recommendations', params)
+
+class AsyncSingleFlight:
+    """Collapse identical concurrent coroutines on the backend loop into one task."""
+
+    def __init__(self):
+        self._tasks = {}
+        self.collapsed = 0
+
+    async def do(self, key, fetch):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.collapsed += 1
+        # Shield so a cancelled follower doesn't cancel everyone else's request
+        return await asyncio.shield(task)
+
+class EventLoopThread:
+    """One background event loop that runs every session's async Spotify work."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="latido-async-spotify", daemon=True
+        )
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and block the calling thread for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+_in_flight = AsyncSingleFlight()
+_http_client = None
+_loop_thread = None
+_loop_thread_lock = threading.Lock()
+
+def get_http_client():
+    """Get the pooled HTTP client shared by every async request on the backend loop."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+    return _http_client
+
+def get_event_loop_thread():
+    """Get the process-wide backend event loop, starting it on first use."""
+    global _loop_thread
+    with _loop_thread_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread()
+        return _loop_thread
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the backend loop from a Streamlit script thread."""
+    return get_event_loop_thread().run(coro, timeout)
+
+async def blocking(func, *args):
+    """Run a blocking call, e.g. a SQLite store read, on a worker thread.
+
+    Every session shares the one event loop, so nothing that can wait on a
+    lock or the disk may run on it directly.
+    """
+    return await asyncio.to_thread(func, *args)
+
+async def get_user_id(client):
+    """Get the Spotify user id of a client, fetching the profile once."""
+    if client.user_id is None:
+        # Concurrent getters of a new client share one profile request
+        profile = await _in_flight.do(
+            ('profile', id(client)), lambda: get_scheduler().call_async(client.current_user)
+        )
+        client.user_id = profile['id']
+    return client.user_id
+
+async def cached_call(client, endpoint, params, fetch, priority=FOREGROUND):
+    """Serve a response from the local cache, scheduling fetch() on a miss."""
+    user_id = await get_user_id(client)
+    cache = get_response_cache()
+    key = ResponseCache.make_key(user_id, endpoint, params)
+    found, value = await blocking(cache.get, key, endpoint)
+    if found:
+        return value
+
+    async def load():
+        value = await get_scheduler().call_async(fetch, priority)
+        if value is not None:
+            await blocking(cache.set, key, endpoint, value)
+        return value
+
+    return await _in_flight.do(key, load)
+
+async def get_user_profile(client):
+    """Get the user's Spotify profile."""
+    return await get_scheduler().call_async(client.current_user)
+
+async def get_top_tracks(client, time_range="medium_term"):
+    """Get the user's top tracks."""
+    return await cached_call(
+        client, 'top_tracks', {'time_range': time_range, 'limit': 50, 'offset': 0},
+        lambda: client.current_user_top_tracks(limit=50, offset=0, time_range=time_range)
+    )
+
+async def get_top_artists(client, time_range="medium_term"):
+    """Get the user's top artists."""
+    return await cached_call(
+        client, 'top_artists', {'time_range': time_range, 'limit': 50, 'offset': 0},
+        lambda: client.current_user_top_artists(limit=50, offset=0, time_range=time_range)
+    )
+
+async def get_all_top_items(client, kind, time_range="medium_term", max_items=None, page_size=50):
+    """Get every page of the user's top tracks or artists, later pages concurrently."""
+    fetch_page = client.current_user_top_tracks if kind == 'tracks' else client.current_user_top_artists
+
+    async def load(offset, priority):
+        limit = page_size if max_items is None else min(page_size, max_items - offset)
+        return await cached_call(
+            client, f'top_{kind}', {'time_range': time_range, 'limit': limit, 'offset': offset},
+            lambda: fetch_page(limit=limit, offset=offset, time_range=time_range),
+            priority
+        )
+
+    first = await load(0, FOREGROUND)
+    if not first or not first['items']:
+        return None
+
+    total = first.get('total') or len(first['items'])
+    if max_items is not None:
+        total = min(total, max_items)
+    offsets = range(len(first['items']), total, page_size)
+    pages = await asyncio.gather(*(load(offset, BACKGROUND) for offset in offsets))
+
+    items = list(first['items'])
+    for page in pages:
+        if not page or not page['items']:
+            break
+        items.extend(page['items'])
+    return {'items': items, 'total': len(items)}
+
+async def get_all_top_tracks(client, time_range="medium_term", max_items=None):
+    """Get the user's complete top tracks list across all pages."""
+    return await get_all_top_items(client, 'tracks', time_range, max_items)
+
+async def get_all_top_artists(client, time_range="medium_term", max_items=None):
+    """Get the user's complete top artists list across all pages."""
+    return await get_all_top_items(client, 'artists', time_range, max_items)
+
+async def get_recent_tracks(client):
+    """Get the user's recently played tracks."""
+    return await cached_call(
+        client, 'recent_tracks', {'limit': 50},
+        lambda: client.current_user_recently_played(limit=50)
+    )
+
+async def sync_listening_history(client, min_interval=HISTORY_SYNC_INTERVAL, max_pages=5):
+    """Append the user's plays since the stored cursor to their local history."""
+    store = get_history_store()
+    user_id = await get_user_id(client)
+
+    async def sync():
+        after_ms, synced_at = await blocking(store.get_cursor, user_id)
+        if time.time() - synced_at < min_interval:
+            return 0
+
+        added = 0
+        for _ in range(max_pages):
+            cursor = after_ms
+            response = await get_scheduler().call_async(
+                lambda: client.current_user_recently_played(limit=50, after=cursor)
+            )
+
+            items = response['items'] if response else []
+            added += await blocking(store.append, user_id, items, after_ms or 0)
+
+            cursor, _ = await blocking(store.get_cursor, user_id)
+            if len(items) < 50 or cursor == after_ms:
+                break
+            after_ms = cursor
+        return added
+
+    return await _in_flight.do(('history', user_id), sync)
+
+async def get_listening_history(client):
+    """Get the user's recent stored listening history after syncing new plays."""
+    await sync_listening_history(client)
+    return await blocking(
+        get_history_store().load, await get_user_id(client), history_window_start(), HISTORY_MAX_PLAYS
+    )
+
+async def get_audio_features(client, track_ids):
+    """Get audio features for a list of tracks, fetching missing batches concurrently."""
+    if not track_ids:
+        return None
+
+    # Audio features never change, so only tracks the store lacks are fetched
+    store = get_audio_feature_store()
+    known = await blocking(store.get_many, track_ids)
+    missing = [track_id for track_id in dict.fromkeys(track_ids) if track_id not in known]
+
+    async def load(batch):
+        return await _in_flight.do(
+            ('audio_features', tuple(batch)),
+            lambda: get_scheduler().call_async(lambda: client.audio_features(batch))
+        )
+
+    # Spotify API only allows 100 tracks per request
+    batches = await asyncio.gather(*(load(missing[i:i+100]) for i in range(0, len(missing), 100)))
+
+    fetched = {}
+    for batch_features in batches:
+        if batch_features:
+            fetched.update((features['id'], features) for features in batch_features if features)
+
+    await blocking(store.set_many, fetched)
+    known.update(fetched)
+    return [known.get(track_id) for track_id in track_ids]
+
+async def resolve_artists(client, artist_ids, priority=FOREGROUND):
+    """Get genres and popularity for many artists, fetching missing batches concurrently."""
+    artist_ids = list(dict.fromkeys(artist_ids))
+    now = time.time()
+    stored = await blocking(get_artist_store().get_many, artist_ids)
+    known = {
+        artist_id: details for artist_id, details in stored.items()
+        if now - details['fetched_at'] < ARTIST_MAX_AGE
+    }
+    missing = [artist_id for artist_id in artist_ids if artist_id not in known]
+
+    async def load(batch):
+        return await _in_flight.do(
+            ('artists', tuple(batch)),
+            lambda: get_scheduler().call_async(lambda: client.artists(batch), priority)
+        )
+
+    # Spotify API only allows 50 artists per request
+    responses = await asyncio.gather(*(load(missing[i:i+50]) for i in range(0, len(missing), 50)))
+    for response in responses:
+        if response:
+            known.update(await blocking(remember_artists, response['artists']))
+    return known
+
+async def get_artist_index(client, top_tracks, recent_tracks, top_artists=None, priority=FOREGROUND):
+    """Get an artist id to genres index covering every loaded track's artists."""
+    # Top artists arrive with their genres, so they never need a lookup
+    if top_artists and 'items' in top_artists:
+        await blocking(remember_top_artists, top_artists['items'])
+    return await resolve_artists(client, collect_artist_ids(top_tracks, recent_tracks), priority)
+
+async def get_recommendations(client, seed_tracks=None, seed_artists=None, limit=10, audio_features_df=None,
+                              feature_summary=None, track_clusters=None, exclude_ids=None):
+    """Get personalized track recommendations based on user's listening patterns."""
+    # Answer from the local candidate pool when it can fill the request
+    if audio_features_df is not None or feature_summary is not None:
+        from features import summarize_features
+        from recommender import recommend_tracks
+        recommendations = await blocking(
+            recommend_tracks, summarize_features(audio_features_df, feature_summary), track_clusters,
+            list(exclude_ids or []) + list(seed_tracks or []), limit
+        )
+        if recommendations:
+            return recommendations
+
+    params = build_recommendation_params(
+        seed_tracks, seed_artists, limit, audio_features_df, feature_summary
+    )
+    return await cached_call(
+        client, 'recommendations', recommendation_cache_params(params),
+        lambda: client.recommendations(**params)
+    )
+
+async def get_unclustered_features(client, recent_tracks):
+    """Get audio features for listened tracks the user's cluster model hasn't seen yet."""
+    from clustering import get_cluster_engine
+
+    track_ids = [item['track']['id'] for item in recent_tracks['items']]
+    unseen = await blocking(get_cluster_engine().unseen, await get_user_id(client), track_ids)
+    return (await get_audio_features(client, unseen) or []) if unseen else []
+
+async def fetch_dashboard_data(client, time_range="medium_term"):
+    """Fetch everything the dashboard needs concurrently on the event loop.
+
+    Returns the same (results, errors) pair as spotify_client.fetch_dashboard_data.
+    """
+    results = {'audio_features': None, 'history_features': None}
+    errors = {}
+
+    async def load(name, coro):
+        try:
+            results[name] = await coro
+        except Exception as e:
+            results[name] = None
+            errors[name] = str(e)
+            return
+        if results[name] is None:
+            errors[name] = "No data returned"
+
+    top_tracks_loaded = asyncio.ensure_future(load('top_tracks', get_all_top_tracks(client, time_range)))
+    top_artists_loaded = asyncio.ensure_future(load('top_artists', get_all_top_artists(client, time_range)))
+    history_loaded = asyncio.ensure_future(load('recent_tracks', get_listening_history(client)))
+
+    async def load_audio_features():
+        await top_tracks_loaded
+        if results['top_tracks']:
+            # Audio features only depend on the top tracks
+            track_ids = [track['id'] for track in results['top_tracks']['items']]
+            await load('audio_features', get_audio_features(client, track_ids))
+
+    async def load_history_features():
+        await history_loaded
+        if results['recent_tracks']:
+            # New history tracks feed the user's incremental clusters
+            await load('history_features', get_unclustered_features(client, results['recent_tracks']))
+
+    async def load_artist_index():
+        await asyncio.gather(top_tracks_loaded, top_artists_loaded, history_loaded)
+        # Genres for every loaded track's artists, alongside the audio-features requests
+        await load('artist_index', get_artist_index(
+            client, results['top_tracks'], results['recent_tracks'], results['top_artists']
+        ))
+
+    await asyncio.gather(load_audio_features(), load_history_features(), load_artist_index())
+
+    try:
+        results['top_albums'] = extract_top_albums(results['top_tracks'])
+    except Exception as e:
+        results['top_albums'] = None
+        errors['top_albums'] = str(e)
+
+    try:
+        results['stored_history_features'] = await blocking(get_stored_history_features, results)
+    except Exception as e:
+        results['stored_history_features'] = None
+        errors['stored_history_features'] = str(e)
+
+    results['user_id'] = client.user_id
+
+    try:
+        await blocking(add_recommendation_candidates, results)
+    except Exception as e:
+        errors['recommendation_candidates'] = str(e)
+
+    return results, errors
+
+def client_for(sp):
+    """Get an async client that shares a spotipy client's credentials and profile.
+
+    Called from the script thread: getting the token may refresh it or read
+    the token store, which must not happen on the shared event loop.
+    """
+    if sp.auth_manager is None:
+        # Fixed-token clients, e.g. ones created for the local stand-in API
+        return AsyncSpotify(sp._auth, user_id=get_sync_user_id(sp))
+    return AsyncSpotify(sp.auth_manager.get_access_token(as_dict=False), user_id=get_sync_user_id(sp))
+
+def fetch_dashboard_data_sync(sp, time_range="medium_term"):
+    """Run the async fetch stage from the Streamlit script for a spotipy client.
+
+    The script thread only waits for the result; every network wait happens on
+    the shared backend loop. Errors are reported here because the loop thread
+    has no Streamlit script context.
+    """
+    results, errors = run_sync(fetch_dashboard_data(client_for(sp), time_range))
+    for name, message in errors.items():
+        st.error(f"Error fetching {name.replace('_', ' ')}: {message}")
+    return results, errors
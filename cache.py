@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import collections
+
+# Local stores live here so they survive restarts and are shared by workers
+DATA_DIR = os.getenv("LATIDO_DATA_DIR", ".latido")
+
+# How long each endpoint's responses stay fresh, in seconds
+ENDPOINT_TTLS = {
+    'top_tracks': 6 * 60 * 60,
+    'top_artists': 6 * 60 * 60,
+    'recent_tracks': 2 * 60,
+    'recommendations': 30 * 60
+}
+DEFAULT_TTL = 10 * 60
+
+def data_path(filename):
+    """Get the path of a file in the local data directory."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
+def connect(path):
+    """Open a SQLite connection that can be shared by threads and processes."""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    # WAL lets readers in other worker processes proceed while one writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class ResponseCache:
+    """Persistent Spotify response cache with per-endpoint TTLs and LRU eviction."""
+
+    def __init__(self, path=None, max_entries=5000, ttls=None):
+        self.path = path or data_path("responses.sqlite3")
+        self.max_entries = max_entries
+        self.ttls = dict(ENDPOINT_TTLS, **(ttls or {}))
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+
+    @staticmethod
+    def make_key(user_id, endpoint, params):
+        """Build the cache key for a user's request to an endpoint."""
+        return json.dumps([user_id, endpoint, params], sort_keys=True, default=str)
+
+    def get(self, key, endpoint):
+        """Return (found, value) for a key, dropping it if it has expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses[endpoint] += 1
+                return False, None
+
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses[endpoint] += 1
+                return False, None
+
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits[endpoint] += 1
+
+        return True, json.loads(value)
+
+    def set(self, key, endpoint, value):
+        """Store a response and evict the least recently used entries over the cap."""
+        now = time.time()
+        ttl = self.ttls.get(endpoint, DEFAULT_TTL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, endpoint, json.dumps(value), now + ttl, now)
+            )
+
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed_at LIMIT ?
+                    )""",
+                    (count - self.max_entries,)
+                )
+
+    def get_or_fetch(self, user_id, endpoint, params, fetch):
+        """Return a cached response, calling fetch() and storing its result on a miss."""
+        key = self.make_key(user_id, endpoint, params)
+        found, value = self.get(key, endpoint)
+        if found:
+            return value
+
+        value = fetch()
+        # Failed calls are not cached so the next rerun tries again
+        if value is not None:
+            self.set(key, endpoint, value)
+        return value
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Get hit and miss counters per endpoint along with the entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                'hits': dict(self.hits),
+                'misses': dict(self.misses),
+                'entries': entries
+            }
+
+class KeyValueStore:
+    """Permanent JSON key-value store for data that never changes once fetched."""
+
+    # Keeps each query under SQLite's bound-parameter limit
+    CHUNK_SIZE = 500
+
+    def __init__(self, path, table='items'):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+    def get_many(self, keys):
+        """Get a dict of the stored values for whichever keys are present."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), self.CHUNK_SIZE):
+                chunk = keys[i:i+self.CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set_many(self, items):
+        """Store a dict of values, replacing any existing ones."""
+        if not items:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in items.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def keys(self):
+        """Get every stored key."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT key FROM {self.table}").fetchall()]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+_response_cache = None
+_audio_feature_store = None
+_artist_store = None
+_track_store = None
+_stores_lock = threading.Lock()
+
+def get_response_cache():
+    """Get the process-wide response cache, creating it on first use."""
+    global _response_cache
+    with _stores_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+def get_audio_feature_store():
+    """Get the audio-features store shared by every user and worker process."""
+    global _audio_feature_store
+    with _stores_lock:
+        if _audio_feature_store is None:
+            _audio_feature_store = KeyValueStore(data_path("audio_features.sqlite3"), 'audio_features')
+        return _audio_feature_store
+
+def get_artist_store():
+    """Get the artist genres and popularity store shared by every user and worker process."""
+    global _artist_store
+    with _stores_lock:
+        if _artist_store is None:
+            _artist_store = KeyValueStore(data_path("artists.sqlite3"), 'artists')
+        return _artist_store
+
+def get_track_store():
+    """Get the display metadata store of tracks that can be recommended."""
+    global _track_store
+    with _stores_lock:
+        if _track_store is None:
+            _track_store = KeyValueStore(data_path("tracks.sqlite3"), 'tracks')
+        return _track_store
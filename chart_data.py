@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# Longer time series are downsampled to this many points before charting
+MAX_SERIES_POINTS = 500
+
+# Days averaged by the rolling feature lines
+ROLLING_DAYS = 7
+
+TREND_FEATURES = ('valence', 'energy', 'danceability')
+
+def lttb(x, y, threshold=MAX_SERIES_POINTS):
+    """Pick the indices of up to threshold points that keep a series' shape.
+
+    Largest-Triangle-Three-Buckets: the first and last points are kept, and
+    from each bucket in between the point forming the largest triangle with
+    the previous pick and the next bucket's average. Peaks and dips survive,
+    unlike with plain averaging or striding.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets over the points between the first and last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    picked = np.empty(threshold, dtype=np.intp)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        picked[i + 1] = previous
+    return picked
+
+def local_days(timeline):
+    """Get each play's calendar day in the timeline's timezone, as days since the epoch."""
+    times = timeline.times
+    if times.tz is not None:
+        times = times.tz_localize(None)
+    return times.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def daily_play_counts(days):
+    """Count plays on every day from the first play to the last, including empty days.
+
+    Returns (first_day, counts).
+    """
+    if not len(days):
+        return 0, np.zeros(0, dtype=np.int64)
+    first = int(days.min())
+    return first, np.bincount(days - first)
+
+def weekly_play_counts(days):
+    """Count plays per Monday-to-Sunday week. Returns (week start days, counts)."""
+    if not len(days):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # Day 0 (1970-01-01) was a Thursday, so weeks start three days later
+    weeks = (days + 3) // 7
+    first = int(weeks.min())
+    counts = np.bincount(weeks - first)
+    return (first + np.arange(len(counts))) * 7 - 3, counts
+
+def play_feature_matrix(recent_tracks, features_by_id, columns=TREND_FEATURES):
+    """Get each play's audio features, in play order; NaN where they're unknown."""
+    items = recent_tracks['items'] if recent_tracks and 'items' in recent_tracks else []
+    # Look each distinct track up once, then spread its row over its plays
+    index, track_ids = pd.factorize(pd.Series([item['track'].get('id') for item in items], dtype=object))
+    table = np.full((len(track_ids) + 1, len(columns)), np.nan)
+    for row, track_id in enumerate(track_ids):
+        features = features_by_id.get(track_id)
+        if features:
+            table[row] = [features.get(column, np.nan) for column in columns]
+    # Missing ids are factorized to -1, which picks the all-NaN last row
+    return table[index]
+
+def rolling_feature_averages(days, values, window=ROLLING_DAYS):
+    """Average each feature over the plays of a trailing window of days.
+
+    values holds one row per play, aligned with days; NaN values are
+    skipped. Returns (first_day, averages) with one row per day, NaN for
+    windows without any known values.
+    """
+    if not len(days):
+        return 0, np.zeros((0, values.shape[1]))
+    first = int(days.min())
+    offsets = days - first
+    n_days = int(offsets.max()) + 1
+    known = ~np.isnan(values)
+
+    sums = np.empty((n_days, values.shape[1]))
+    counts = np.empty((n_days, values.shape[1]))
+    for j in range(values.shape[1]):
+        sums[:, j] = np.bincount(offsets, weights=np.where(known[:, j], values[:, j], 0.0), minlength=n_days)
+        counts[:, j] = np.bincount(offsets, weights=known[:, j], minlength=n_days)
+
+    # Trailing window sums from the running totals
+    sums = np.cumsum(sums, axis=0)
+    counts = np.cumsum(counts, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return first, np.where(counts > 0, sums / counts, np.nan)
+
+def day_dates(days):
+    """Format days since the epoch as ISO dates, the shortest form Plotly reads as dates."""
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype('datetime64[D]'), unit='D')
+
+def build_history_chart_data(timeline, play_features=None, max_points=MAX_SERIES_POINTS):
+    """Aggregate a listening history into fixed-size chart data.
+
+    The heatmap is always 7x24, and the daily series are downsampled with
+    LTTB, so what reaches the browser stays the same size however long the
+    history grows.
+    """
+    days = local_days(timeline)
+
+    first_day, daily = daily_play_counts(days)
+    keep = lttb(np.arange(len(daily)), daily, max_points)
+    week_starts, weekly = weekly_play_counts(days)
+    keep_weeks = lttb(week_starts, weekly, max_points)
+
+    chart_data = {
+        'hour_weekday_counts': timeline.hour_weekday_counts,
+        'daily_dates': day_dates(first_day + keep),
+        'daily_counts': daily[keep],
+        'weekly_dates': day_dates(week_starts[keep_weeks]),
+        'weekly_counts': weekly[keep_weeks],
+        'trend_features': TREND_FEATURES,
+        'trend_dates': day_dates([]),
+        'trend_values': np.zeros((0, len(TREND_FEATURES)), dtype=np.float32)
+    }
+
+    if play_features is not None and len(play_features):
+        first_day, averages = rolling_feature_averages(days, play_features)
+        # Downsample on the mean of the features so every line keeps the same days
+        has_value = ~np.isnan(averages).all(axis=1)
+        positions = np.flatnonzero(has_value)
+        keep = positions[lttb(positions, np.nanmean(averages[has_value], axis=1), max_points)]
+        chart_data['trend_dates'] = day_dates(first_day + keep)
+        # Single precision is plenty for 0-1 averages and halves the payload
+        chart_data['trend_values'] = averages[keep].astype(np.float32)
+
+    return chart_data
@@ -0,0 +1,242 @@
+import time
+import pickle
+import logging
+import threading
+import collections
+import numpy as np
+from cache import connect, data_path
+from features import get_track_ids
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_FEATURES = ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness']
+
+# Candidate cluster counts, scored on a sample of the user's history
+K_CANDIDATES = (2, 3, 4, 5, 6)
+
+# Users with fewer tracks than this are clustered one-shot instead
+MIN_TRACKS = 12
+
+# Rows kept as a uniform sample of the whole history, used to re-choose k
+RESERVOIR_SIZE = 1000
+SILHOUETTE_SAMPLE = 500
+BATCH_SIZE = 256
+
+# Models kept warm in memory; the rest are reloaded from the store on use
+MAX_CACHED_MODELS = 256
+
+# Users share this many locks, so the engine holds a fixed number however
+# many users it has seen
+LOCK_STRIPES = 64
+
+def choose_k(X, random_state=42):
+    """Pick the candidate k with the best silhouette score on a sample of X."""
+    # scikit-learn takes seconds to import, so it's loaded on first use
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    candidates = [k for k in K_CANDIDATES if k < len(X)]
+    if not candidates:
+        return max(1, min(2, len(X)))
+
+    best_k, best_score = candidates[0], -1.0
+    for k in candidates:
+        labels = MiniBatchKMeans(
+            n_clusters=k, batch_size=BATCH_SIZE, n_init=3, random_state=random_state
+        ).fit_predict(X)
+        if len(set(labels)) < 2:
+            continue
+        score = silhouette_score(X, labels, sample_size=min(SILHOUETTE_SAMPLE, len(X)), random_state=random_state)
+        if score > best_score:
+            best_k, best_score = k, score
+    return best_k
+
+class UserClusterModel:
+    """One user's incrementally trained track clusters.
+
+    New tracks are folded in with MiniBatchKMeans.partial_fit and counted
+    against the cluster they land in, so an update costs only the new rows.
+    A fixed-size reservoir sample of the history is kept so k can be
+    re-chosen, and the model refit on the sample alone, once the history has
+    doubled since k was last picked.
+    """
+
+    def __init__(self, random_state=42):
+        self.random_state = random_state
+        self.model = None
+        self.k = None
+        self.k_chosen_at = 0
+        self.seen = set()
+        self.n_seen = 0
+        self.counts = None
+        self.reservoir = np.empty((0, len(CLUSTER_FEATURES)), dtype=np.float32)
+        self._rng = np.random.default_rng(random_state)
+
+    def _sample(self, X):
+        """Add rows to the reservoir so it stays a uniform sample of everything seen."""
+        space = RESERVOIR_SIZE - len(self.reservoir)
+        if space > 0:
+            self.reservoir = np.concatenate([self.reservoir, X[:space]])
+            self.n_seen += len(X[:space])
+            X = X[space:]
+        if len(X):
+            # Row t replaces a random slot with probability RESERVOIR_SIZE / t
+            slots = self._rng.integers(0, self.n_seen + np.arange(1, len(X) + 1))
+            replaced = slots < RESERVOIR_SIZE
+            self.reservoir[slots[replaced]] = X[replaced]
+            self.n_seen += len(X)
+
+    def _refit(self):
+        """Choose k on the reservoir and fit a fresh model to it."""
+        from sklearn.cluster import MiniBatchKMeans
+        self.k = choose_k(self.reservoir, self.random_state)
+        self.k_chosen_at = self.n_seen
+        self.model = MiniBatchKMeans(
+            n_clusters=self.k, batch_size=BATCH_SIZE, n_init=3, random_state=self.random_state
+        ).fit(self.reservoir)
+        # Scale the sample's assignments up to the whole history
+        sample_counts = np.bincount(self.model.predict(self.reservoir), minlength=self.k)
+        self.counts = sample_counts * (self.n_seen / len(self.reservoir))
+
+    def update(self, track_ids, X):
+        """Fold in the rows for tracks not seen before; returns how many were new."""
+        new = []
+        for i, track_id in enumerate(track_ids):
+            if track_id not in self.seen:
+                self.seen.add(track_id)
+                new.append(i)
+        if not new:
+            return 0
+        X = np.ascontiguousarray(X[new], dtype=np.float32)
+        self._sample(X)
+
+        if self.model is None or self.n_seen >= 2 * self.k_chosen_at:
+            self._refit()
+        else:
+            for i in range(0, len(X), BATCH_SIZE):
+                self.model.partial_fit(X[i:i+BATCH_SIZE])
+            self.counts = self.counts + np.bincount(self.model.predict(X), minlength=self.k)
+        return len(new)
+
+    def clusters(self):
+        """Return (centers, counts) over the user's whole history."""
+        return self.model.cluster_centers_, np.rint(self.counts).astype(int)
+
+class ClusterModelStore:
+    """Per-user cluster models, pickled into SQLite so they survive restarts."""
+
+    def __init__(self, path=None):
+        self.path = path or data_path("clusters.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS models (
+                user_id TEXT PRIMARY KEY,
+                state BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def load(self, user_id):
+        """Get a user's stored model, or None if there is none or it can't be loaded."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM models WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            # e.g. a model pickled by another scikit-learn version; dropping it
+            # lets the next load rebuild the model from the user's history
+            logger.warning("Dropping unreadable cluster model for %s: %s", user_id, e)
+            self.delete(user_id)
+            return None
+
+    def delete(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM models WHERE user_id = ?", (user_id,))
+
+    def save(self, user_id, model):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO models VALUES (?, ?, ?)",
+                (user_id, pickle.dumps(model), time.time())
+            )
+
+class ClusterEngine:
+    """Keeps recently used cluster models warm in memory, backed by the store.
+
+    Models are saved whenever they change, so the least recently used ones
+    can be dropped once more than max_models are cached.
+    """
+
+    def __init__(self, store=None, max_models=MAX_CACHED_MODELS):
+        self.store = store or ClusterModelStore()
+        self.max_models = max_models
+        self._models = collections.OrderedDict()
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._lock = threading.Lock()
+
+    def _user_lock(self, user_id):
+        return self._locks[hash(user_id) % len(self._locks)]
+
+    def _get(self, user_id):
+        with self._lock:
+            model = self._models.get(user_id)
+            if model is not None:
+                self._models.move_to_end(user_id)
+                return model
+
+        # Loading happens outside the engine lock so other users aren't held up
+        model = self.store.load(user_id) or UserClusterModel()
+        with self._lock:
+            self._models[user_id] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return model
+
+    def unseen(self, user_id, track_ids):
+        """Get the track ids the user's model has not clustered yet."""
+        with self._user_lock(user_id):
+            seen = self._get(user_id).seen
+            return [track_id for track_id in dict.fromkeys(track_ids) if track_id and track_id not in seen]
+
+    def update(self, user_id, feature_frames):
+        """Fold new tracks from the feature tables into the user's model.
+
+        Returns (centers, counts), or None while the user has too few tracks
+        for a stable model. Reruns without new tracks neither fit nor save.
+        """
+        track_ids, rows = [], []
+        for frame in feature_frames:
+            if frame is None or not len(frame):
+                continue
+            track_ids.extend(get_track_ids().lookup(frame['track_code'].to_numpy()))
+            rows.append(frame[CLUSTER_FEATURES].to_numpy(dtype=np.float32))
+
+        with self._user_lock(user_id):
+            model = self._get(user_id)
+            if rows:
+                X = np.concatenate(rows)
+                keep = [i for i, track_id in enumerate(track_ids) if track_id is not None]
+                ids = [track_ids[i] for i in keep]
+                if model.model is None and len(set(ids)) < MIN_TRACKS:
+                    return None
+                if model.update(ids, X[keep]):
+                    self.store.save(user_id, model)
+            if model.model is None:
+                return None
+            return model.clusters()
+
+_cluster_engine = None
+_cluster_engine_lock = threading.Lock()
+
+def get_cluster_engine():
+    """Get the clustering engine shared by the process."""
+    global _cluster_engine
+    with _cluster_engine_lock:
+        if _cluster_engine is None:
+            _cluster_engine = ClusterEngine()
+        return _cluster_engine
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+# What main.py imports before its first paint, and the stack it defers
+FIRST_PAINT_MODULES = ("streamlit", "visualizations", "demo")
+DEFERRED_MODULES = ("spotify_client", "async_client", "analysis", "sklearn.cluster")
+
+# None of these may be loaded before the hero and login render
+HEAVY_MODULES = ("pandas", "sklearn", "scipy", "spotipy", "httpx")
+
+# Budget for the first-paint imports; Streamlit itself takes most of it
+IMPORT_BUDGET_MS = 800
+
+PROBE = """
+import sys, time, json
+for name in sys.argv[1].split(",") if sys.argv[1] else []:
+    __import__(name)
+start = time.perf_counter()
+for name in sys.argv[2].split(","):
+    __import__(name)
+print(json.dumps({'ms': (time.perf_counter() - start) * 1000, 'modules': sorted(sys.modules)}))
+"""
+
+def measure_imports(modules, preload=()):
+    """Import modules in a fresh interpreter after preload; returns (milliseconds, loaded module names)."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, ",".join(preload), ",".join(modules)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report['ms'], report['modules']
+
+def measure(runs):
+    """Get the median import times of the first-paint and deferred modules over several runs."""
+    first_paint, deferred = [], []
+    loaded = set()
+    for _ in range(runs):
+        ms, modules = measure_imports(FIRST_PAINT_MODULES)
+        first_paint.append(ms)
+        loaded.update(modules)
+        deferred.append(measure_imports(DEFERRED_MODULES, FIRST_PAINT_MODULES)[0])
+    return {
+        'first_paint_ms': round(statistics.median(first_paint), 1),
+        'deferred_ms': round(statistics.median(deferred), 1),
+        'heavy_before_first_paint': sorted(
+            name for name in HEAVY_MODULES if name in loaded
+        )
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Check main.py's first-paint imports against the cold-start budget")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to measure, the median is reported")
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--json', dest='json_path', default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = measure(args.runs)
+    report['budget_ms'] = args.budget_ms
+    report['ok'] = report['first_paint_ms'] <= args.budget_ms and not report['heavy_before_first_paint']
+
+    print(f"first paint imports: {report['first_paint_ms']} ms (budget {args.budget_ms} ms)")
+    print(f"deferred analytics imports: {report['deferred_ms']} ms")
+    if report['heavy_before_first_paint']:
+        print(f"loaded before first paint: {', '.join(report['heavy_before_first_paint'])}")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report['ok'] else 1)
+
+if __name__ == "__main__":
+    main()
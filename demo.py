@@ -0,0 +1,56 @@
+import os
+import random
+import threading
+from datetime import datetime
+
+DEMO_SEED = int(os.getenv("LATIDO_DEMO_SEED", "42"))
+TIME_RANGES = ("short_term", "medium_term", "long_term")
+
+def build_demo_snapshot(time_range, seed=DEMO_SEED, now=None):
+    """Build the demo data and its analysis for one time range from a fixed seed."""
+    # The analytics stack is loaded here, off the import path of main.py
+    from simulation import get_simulated_data
+    from analysis import analyze_dashboard
+
+    # A private generator keeps the build reproducible while other threads
+    # draw from the shared random module
+    data = get_simulated_data(time_range, now=now, rng=random.Random(f"{seed}:{time_range}"))
+
+    data['artist_index'] = None
+    return {'data': data, 'analysis': analyze_dashboard(data)}
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_snapshots_now = None
+_warm_thread = None
+
+def get_demo_snapshot(time_range, seed=DEMO_SEED):
+    """Get the shared demo snapshot for a time range, building it on first use.
+
+    Snapshots are shared by every session in the process and must be
+    treated as read-only.
+    """
+    global _snapshots_now
+    with _snapshots_lock:
+        if time_range not in _snapshots:
+            if _snapshots_now is None:
+                # Anchor play times to midnight so every worker process builds the same data
+                _snapshots_now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            _snapshots[time_range] = build_demo_snapshot(time_range, seed, _snapshots_now)
+        return _snapshots[time_range]
+
+def get_demo_snapshots():
+    """Get the demo snapshot for every time range."""
+    return {time_range: get_demo_snapshot(time_range) for time_range in TIME_RANGES}
+
+def warm_demo_snapshots():
+    """Build the remaining time ranges on a background thread so switching ranges doesn't wait.
+
+    Called once a demo page has been sent rather than at import, so the
+    build never competes with a cold start's first script run.
+    """
+    global _warm_thread
+    with _snapshots_lock:
+        if _warm_thread is None and len(_snapshots) < len(TIME_RANGES):
+            _warm_thread = threading.Thread(target=get_demo_snapshots, name="latido-demo-snapshots", daemon=True)
+            _warm_thread.start()
@@ -0,0 +1,189 @@
+import warnings
+import threading
+import numpy as np
+import pandas as pd
+
+# Numeric audio-feature columns the analyses and charts read
+FEATURE_COLUMNS = (
+    'danceability', 'energy', 'valence', 'tempo', 'acousticness', 'instrumentalness',
+    'liveness', 'speechiness', 'loudness', 'key', 'mode', 'duration_ms'
+)
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+# Fixed schema of the processed feature table; every other API field is dropped
+FLOAT32_COLUMNS = (
+    'danceability', 'energy', 'valence', 'tempo', 'acousticness', 'instrumentalness',
+    'liveness', 'speechiness', 'loudness'
+)
+INT8_COLUMNS = ('key', 'mode')
+
+# Values used for features the API left out
+FEATURE_DEFAULTS = {
+    'danceability': 0.5, 'energy': 0.5, 'key': 0, 'mode': 1,
+    'loudness': -10, 'speechiness': 0.1, 'acousticness': 0.5,
+    'instrumentalness': 0.1, 'liveness': 0.1, 'valence': 0.5,
+    'tempo': 120, 'duration_ms': 200000
+}
+
+class FeatureSummary:
+    """Count, mean, std, min, max and quantiles of every audio-feature column.
+
+    Built once per dataset with a handful of vectorized reductions over a
+    single float matrix, then passed to every analysis and chart that needs
+    column statistics instead of each one re-reading the DataFrame. Missing
+    values are skipped, and std uses ddof=1 like pandas. Quantiles need a
+    partial sort, so they are computed on first use and then kept.
+    """
+
+    def __init__(self, columns, values):
+        self.columns = tuple(columns)
+        self._index = {column: i for i, column in enumerate(self.columns)}
+        self._values = values
+        self._quantiles = None
+
+        # Empty and single-row columns have no spread; report NaN like pandas does
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if not len(values):
+                empty = np.full(len(self.columns), np.nan)
+                self.count = np.zeros(len(self.columns), dtype=np.int64)
+                self._mean, self._std, self._min, self._max = empty, empty, empty, empty
+            elif np.isnan(values).any():
+                self.count = np.count_nonzero(~np.isnan(values), axis=0)
+                self._mean = np.nanmean(values, axis=0)
+                self._std = np.nanstd(values, axis=0, ddof=1)
+                self._min = np.nanmin(values, axis=0)
+                self._max = np.nanmax(values, axis=0)
+            else:
+                self.count = np.full(len(self.columns), len(values))
+                self._mean = values.mean(axis=0)
+                self._std = values.std(axis=0, ddof=1)
+                self._min = values.min(axis=0)
+                self._max = values.max(axis=0)
+
+    @classmethod
+    def from_frame(cls, audio_features_df, columns=FEATURE_COLUMNS):
+        """Summarize the feature columns present in an audio-features DataFrame."""
+        columns = [column for column in columns if column in audio_features_df.columns]
+        return cls(columns, audio_features_df[columns].to_numpy(dtype=np.float64, na_value=np.nan))
+
+    @property
+    def quantiles(self):
+        """Quantiles of every column, one row per entry in QUANTILES."""
+        if self._quantiles is None:
+            if len(self._values):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    self._quantiles = np.nanquantile(self._values, QUANTILES, axis=0)
+            else:
+                self._quantiles = np.full((len(QUANTILES), len(self.columns)), np.nan)
+        return self._quantiles
+
+    def mean(self, column):
+        return float(self._mean[self._index[column]])
+
+    def std(self, column):
+        return float(self._std[self._index[column]])
+
+    def min(self, column):
+        return float(self._min[self._index[column]])
+
+    def max(self, column):
+        return float(self._max[self._index[column]])
+
+    def quantile(self, column, q):
+        """Get a quantile of a column; q must be one of QUANTILES."""
+        return float(self.quantiles[QUANTILES.index(q), self._index[column]])
+
+    def means(self, columns):
+        """Get the means of several columns, in the given order."""
+        return [self.mean(column) for column in columns]
+
+    def to_dict(self):
+        """Get every statistic keyed by column."""
+        return {
+            column: {
+                'count': int(self.count[i]),
+                'mean': float(self._mean[i]),
+                'std': float(self._std[i]),
+                'min': float(self._min[i]),
+                'max': float(self._max[i]),
+                **{f"q{round(q * 100)}": float(self.quantiles[j, i]) for j, q in enumerate(QUANTILES)}
+            }
+            for column, i in self._index.items()
+        }
+
+def summarize_features(audio_features_df, feature_summary=None):
+    """Get the dataset's feature summary, computing it only if the caller has none."""
+    if feature_summary is not None:
+        return feature_summary
+    return FeatureSummary.from_frame(audio_features_df)
+
+class TrackIdInterner:
+    """Process-wide mapping between Spotify track ids and small integer codes.
+
+    Feature tables store an int32 code per row instead of the 22-character id
+    string, and every session shares the one mapping.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def intern_many(self, track_ids):
+        """Get the codes for a list of ids, assigning new ones as needed; None maps to -1."""
+        codes = np.empty(len(track_ids), dtype=np.int32)
+        with self._lock:
+            for i, track_id in enumerate(track_ids):
+                if track_id is None:
+                    codes[i] = -1
+                    continue
+                code = self._codes.get(track_id)
+                if code is None:
+                    code = self._codes[track_id] = len(self._ids)
+                    self._ids.append(track_id)
+                codes[i] = code
+        return codes
+
+    def lookup(self, codes):
+        """Get the track ids for a sequence of codes."""
+        with self._lock:
+            return [self._ids[code] if code >= 0 else None for code in codes]
+
+    def __len__(self):
+        return len(self._ids)
+
+_track_ids = None
+_track_ids_lock = threading.Lock()
+
+def get_track_ids():
+    """Get the track-id interner shared by the process."""
+    global _track_ids
+    with _track_ids_lock:
+        if _track_ids is None:
+            _track_ids = TrackIdInterner()
+        return _track_ids
+
+def column_array(items, column, dtype):
+    """Read one field of every API item into a typed array, filling gaps with the default."""
+    default = FEATURE_DEFAULTS[column]
+    values = (item.get(column) for item in items)
+    return np.fromiter((default if value is None else value for value in values), dtype=dtype, count=len(items))
+
+def build_feature_frame(audio_features):
+    """Build the compact, fixed-schema feature table straight from audio-features API items.
+
+    Each field is read directly into a typed array: float32 features, int8 key
+    and mode, int32 duration and an int32 track code from the shared interner.
+    Missing tracks (None items) are skipped.
+    """
+    items = [item for item in audio_features if item]
+    columns = {'track_code': get_track_ids().intern_many([item.get('id') for item in items])}
+    for column in FLOAT32_COLUMNS:
+        columns[column] = column_array(items, column, np.float32)
+    for column in INT8_COLUMNS:
+        columns[column] = column_array(items, column, np.int8)
+    columns['duration_ms'] = column_array(items, 'duration_ms', np.int32)
+    return pd.DataFrame(columns)
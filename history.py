@@ -0,0 +1,101 @@
+import json
+import time
+import threading
+from datetime import datetime
+from cache import connect, data_path
+
+def played_at_ms(played_at):
+    """Convert a Spotify played_at timestamp to epoch milliseconds."""
+    return int(datetime.fromisoformat(played_at.replace('Z', '+00:00')).timestamp() * 1000)
+
+class ListeningHistoryStore:
+    """Per-user store of every play ingested from the recently-played endpoint."""
+
+    def __init__(self, path=None):
+        self.path = path or data_path("history.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS plays (
+                user_id TEXT NOT NULL,
+                played_at_ms INTEGER NOT NULL,
+                played_at TEXT NOT NULL,
+                track TEXT NOT NULL,
+                PRIMARY KEY (user_id, played_at_ms)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cursors (
+                user_id TEXT PRIMARY KEY,
+                after_ms INTEGER NOT NULL,
+                synced_at REAL NOT NULL
+            )
+        """)
+
+    def get_cursor(self, user_id):
+        """Return (after_ms, synced_at) for a user, or (None, 0) before the first sync."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT after_ms, synced_at FROM cursors WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row if row else (None, 0)
+
+    def append(self, user_id, items, after_ms=None):
+        """Add new plays and advance the user's cursor. Returns how many were new."""
+        rows = [
+            (user_id, played_at_ms(item['played_at']), item['played_at'], json.dumps(item['track']))
+            for item in items
+        ]
+        if rows:
+            after_ms = max([after_ms or 0] + [row[1] for row in rows])
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany("INSERT OR IGNORE INTO plays VALUES (?, ?, ?, ?)", rows)
+                added = self._conn.total_changes - before
+                if after_ms is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO cursors VALUES (?, ?, ?)",
+                        (user_id, after_ms, time.time())
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def load(self, user_id, since_ms=None, limit=None):
+        """Get a user's stored plays, newest first, shaped like a recently-played response."""
+        query = "SELECT played_at, track FROM plays WHERE user_id = ?"
+        params = [user_id]
+        if since_ms is not None:
+            query += " AND played_at_ms >= ?"
+            params.append(since_ms)
+        query += " ORDER BY played_at_ms DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {'items': [{'played_at': played_at, 'track': json.loads(track)} for played_at, track in rows]}
+
+    def count(self, user_id):
+        """Get the number of stored plays for a user."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM plays WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+def get_history_store():
+    """Get the listening-history store shared by the process."""
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = ListeningHistoryStore()
+        return _history_store
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import collections
+from contextlib import contextmanager
+import numpy as np
+import streamlit.logger
+
+# Stages in pipeline order, mirroring main(). The steps from
+# process_audio_features to analyze_taste_profile are timed inside
+# analysis.analyze_dashboard() and only run when its memo misses.
+STAGES = (
+    "fetch", "analyze_dashboard",
+    "process_audio_features", "summarize_features", "analyze_mood", "analyze_music_patterns",
+    "genre_distribution", "calculate_listening_trends", "history_chart_data", "cluster_tracks",
+    "analyze_taste_profile",
+    "recommendations", "audio_features_radar_spec",
+    "genre_bar_chart_spec", "listening_time_chart_spec", "history_chart_specs", "total"
+)
+
+TIME_RANGES = ("short_term", "medium_term", "long_term")
+
+class StageTimer:
+    """Thread-safe collection of wall-clock timings per pipeline stage."""
+
+    def __init__(self):
+        self.timings = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors[stage] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[stage].append(elapsed)
+
+    def summary(self):
+        """Get count, mean, p50, p95, p99 and max in milliseconds for each stage."""
+        with self._lock:
+            timings = {stage: list(values) for stage, values in self.timings.items()}
+            errors = dict(self.errors)
+
+        summary = {}
+        for stage in STAGES:
+            if stage not in timings:
+                continue
+            values = np.array(timings[stage]) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[stage] = {
+                'count': len(values),
+                'errors': errors.get(stage, 0),
+                'mean_ms': round(float(values.mean()), 2),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(values.max()), 2)
+            }
+        return summary
+
+def peak_rss_mb():
+    """Get the process's peak resident set size in MB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def simulated_session(session_id):
+    """Get a fetch function that serves freshly generated simulated data."""
+    from simulation import get_simulated_data
+
+    def fetch(time_range):
+        data = get_simulated_data(time_range)
+        data['artist_index'] = None
+        return data
+
+    return fetch, None
+
+def stub_session(session_id, use_async=False):
+    """Get fetch and recommendation functions that call the API stand-in as their own user."""
+    from spotify_client import create_token_client, fetch_dashboard_data, get_recommendations
+    from async_client import fetch_dashboard_data_sync
+
+    sp = create_token_client(f"loadtest{session_id}")
+    fetch_dashboard = fetch_dashboard_data_sync if use_async else fetch_dashboard_data
+
+    def fetch(time_range):
+        data, errors = fetch_dashboard(sp, time_range)
+        if errors:
+            raise RuntimeError(f"fetch failed: {errors}")
+        return data
+
+    def recommend(data, audio_features_df, feature_summary, track_clusters):
+        return get_recommendations(
+            sp,
+            seed_tracks=[track['id'] for track in data['top_tracks']['items'][:2]],
+            seed_artists=[artist['id'] for artist in data['top_artists']['items'][:3]],
+            limit=10,
+            audio_features_df=audio_features_df,
+            feature_summary=feature_summary,
+            track_clusters=track_clusters,
+            exclude_ids=[track['id'] for track in data['top_tracks']['items']]
+            + [item['track']['id'] for item in data['recent_tracks']['items']]
+        )
+
+    return fetch, recommend
+
+def run_pipeline(fetch, recommend, timer, time_range):
+    """Run one dashboard load the way main() does, timing every stage."""
+    from analysis import analyze_dashboard
+    from visualizations import (
+        audio_features_radar_spec, genre_bar_chart_spec, listening_time_chart_spec,
+        listening_heatmap_spec, play_history_chart_spec, mood_trend_chart_spec
+    )
+
+    with timer.time("total"):
+        with timer.time("fetch"):
+            data = fetch(time_range)
+
+        # The app's own analysis stage, which times each of its steps; reruns
+        # over unchanged data are served whole from the memo, as in the app
+        with timer.time("analyze_dashboard"):
+            analysis = analyze_dashboard(data, timer=timer)
+        audio_features_df = analysis['audio_features_df']
+        feature_summary = analysis['feature_summary']
+        genres = analysis['genres']
+        listening_timeline = analysis['listening_timeline']
+        history_chart_data = analysis['history_chart_data']
+        track_clusters = analysis['track_clusters']
+
+        if recommend:
+            with timer.time("recommendations"):
+                recommend(data, audio_features_df, feature_summary, track_clusters)
+
+        # Each chart is built and serialized to the JSON sent to the browser
+        with timer.time("audio_features_radar_spec"):
+            audio_features_radar_spec(audio_features_df, feature_summary)
+        with timer.time("genre_bar_chart_spec"):
+            genre_bar_chart_spec(genres)
+        with timer.time("listening_time_chart_spec"):
+            listening_time_chart_spec(data['recent_tracks'], listening_timeline)
+        with timer.time("history_chart_specs"):
+            listening_heatmap_spec(history_chart_data)
+            play_history_chart_spec(history_chart_data)
+            mood_trend_chart_spec(history_chart_data)
+
+def run_load(make_session, sessions, iterations, think_time=0.0, seed=None):
+    """Run concurrent sessions that each load the dashboard repeatedly.
+
+    Streamlit serves every browser session on its own script thread, so each
+    simulated session is a thread. Returns the timer and the wall-clock time.
+    """
+    timer = StageTimer()
+    start_barrier = threading.Barrier(sessions + 1)
+    rng = random.Random(seed)
+    plans = [[rng.choice(TIME_RANGES) for _ in range(iterations)] for _ in range(sessions)]
+
+    def session(session_id):
+        fetch, recommend = make_session(session_id)
+        start_barrier.wait()
+        for time_range in plans[session_id]:
+            try:
+                run_pipeline(fetch, recommend, timer, time_range)
+            except Exception as e:
+                print(f"session {session_id}: {e}", file=sys.stderr)
+            if think_time:
+                time.sleep(think_time)
+
+    threads = [
+        threading.Thread(target=session, args=(i,), name=f"loadtest-session-{i}", daemon=True)
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return timer, time.perf_counter() - started
+
+def format_report(report):
+    """Format a load-test report as a plain-text table."""
+    lines = [
+        f"sessions={report['sessions']} iterations={report['iterations']} source={report['source']}",
+        f"completed={report['completed']} failed={report['failed']} "
+        f"wall={report['wall_s']}s throughput={report['throughput_per_s']} loads/s "
+        f"peak_rss={report['peak_rss_mb']} MB",
+        "",
+        f"{'stage':<30}{'count':>7}{'errors':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    ]
+    for stage, row in report['stages'].items():
+        lines.append(
+            f"{stage:<30}{row['count']:>7}{row['errors']:>8}{row['mean_ms']:>10}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+    if report.get('scheduler'):
+        lines += ["", f"scheduler: {report['scheduler']}"]
+    if report.get('memo'):
+        lines += ["", f"memo: {report['memo']}"]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the dashboard pipeline from many concurrent sessions")
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent sessions")
+    parser.add_argument('--iterations', type=int, default=5, help="dashboard loads per session")
+    parser.add_argument('--source', choices=("simulated", "stub"), default="simulated",
+                        help="serve simulated data in-process, or call the local API stand-in")
+    parser.add_argument('--api-base', default=None,
+                        help="stand-in URL to use instead of starting one in-process, e.g. http://127.0.0.1:8900/v1/")
+    parser.add_argument('--async-backend', action='store_true', help="fetch through the asyncio backend")
+    parser.add_argument('--latency-ms', type=float, default=80, help="in-process stand-in latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="in-process stand-in 500 rate")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="in-process stand-in 429 rate")
+    parser.add_argument('--rate', type=float, default=None, help="scheduler requests per second (LATIDO_SPOTIFY_RATE)")
+    parser.add_argument('--burst', type=int, default=None, help="scheduler burst size (LATIDO_SPOTIFY_BURST)")
+    parser.add_argument('--think-time', type=float, default=0.0, help="seconds each session idles between loads")
+    parser.add_argument('--data-dir', default=None,
+                        help="directory for the local stores; defaults to a fresh temporary directory")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', dest='json_path', default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    # Getters report failures with st.error, which only warns outside a script run
+    streamlit.logger.set_log_level("error")
+
+    make_session = simulated_session
+    scheduler = None
+    if args.source == "stub":
+        # The client modules read these at import time, so set them first
+        os.environ.setdefault("LATIDO_DATA_DIR", args.data_dir or tempfile.mkdtemp(prefix="latido-loadtest-"))
+        api_base = args.api_base
+        if not api_base:
+            from spotify_stub import StubConfig, start_stub_server
+            _, api_base = start_stub_server(StubConfig(
+                latency_ms=args.latency_ms, error_rate=args.error_rate,
+                throttle_rate=args.throttle_rate, seed=args.seed
+            ))
+        os.environ["SPOTIFY_API_BASE"] = api_base
+        if args.rate is not None:
+            os.environ["LATIDO_SPOTIFY_RATE"] = str(args.rate)
+        if args.burst is not None:
+            os.environ["LATIDO_SPOTIFY_BURST"] = str(args.burst)
+
+        from scheduler import get_scheduler
+        scheduler = get_scheduler()
+        make_session = lambda session_id: stub_session(session_id, args.async_backend)
+
+    from memo import get_memo_cache
+    timer, wall = run_load(make_session, args.sessions, args.iterations, args.think_time, args.seed)
+    stages = timer.summary()
+    completed = stages.get("total", {}).get("count", 0) - stages.get("total", {}).get("errors", 0)
+    report = {
+        'sessions': args.sessions,
+        'iterations': args.iterations,
+        'source': args.source + (" (async)" if args.async_backend and args.source == "stub" else ""),
+        'completed': completed,
+        'failed': args.sessions * args.iterations - completed,
+        'wall_s': round(wall, 2),
+        'throughput_per_s': round(completed / wall, 2) if wall else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'scheduler': scheduler.stats() if scheduler else None,
+        'memo': get_memo_cache().stats()
+    }
+
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
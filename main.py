@@ -1,55 +1,53 @@
 import streamlit as st
-import time
 import base64
-from spotify_client import (
-    create_spotify_client, get_user_profile, get_top_tracks,
-    get_top_artists, get_recent_tracks, get_audio_features,
-    get_top_albums, get_recommendations
-)
-from analysis import (
-    process_audio_features, analyze_mood, get_genre_distribution,
-    calculate_listening_trends, analyze_music_patterns, cluster_tracks,
-    analyze_taste_profile
-)
+import os
+import threading
 from visualizations import (
-    create_audio_features_radar, create_genre_bar_chart,
-    create_listening_time_chart
+    add_logo_styling, audio_features_radar_spec, genre_bar_chart_spec,
+    listening_time_chart_spec, listening_heatmap_spec, play_history_chart_spec,
+    mood_trend_chart_spec, show_chart
 )
-from simulation import get_simulated_data
+from demo import get_demo_snapshot, warm_demo_snapshots
 
-# Import os for file operations
-import os
+# The Spotify clients and the analytics stack (pandas, scikit-learn) are
+# imported inside main(), so the hero and login render before they load
+
+FAVICON_PATH = "generated-icon.png"
 
-# Set favicon
-favicon_path = "generated-icon.png"
-# If no favicon file exists, create one
-if not os.path.exists(favicon_path):
+def create_favicon(path=FAVICON_PATH):
+    """Draw the heartbeat logo favicon."""
     from PIL import Image, ImageDraw
-    # Create a heartbeat logo favicon
     img = Image.new('RGBA', (64, 64), color=(18, 18, 18, 255))
     draw = ImageDraw.Draw(img)
     # Draw a heartbeat line
     points = [(8, 32), (16, 32), (20, 16), (28, 48), (36, 24), (44, 32), (56, 32)]
     draw.line(points, fill=(255, 51, 102, 255), width=3)
-    img.save(favicon_path, 'PNG')
+    img.save(path, 'PNG')
+
+# The favicon ships with the app; if it's missing, show an emoji and draw
+# the file in the background rather than before the first paint
+page_icon = FAVICON_PATH
+if not os.path.exists(FAVICON_PATH):
+    page_icon = "💓"
+    threading.Thread(target=create_favicon, name="latido-favicon", daemon=True).start()
 
 st.set_page_config(
     page_title="Latido - Musical Heart Rhythm",
-    page_icon=favicon_path,
+    page_icon=page_icon,
     layout="wide",
     initial_sidebar_state="collapsed"
 )
 
-
-# Import os for file operations
-import os
+@st.cache_resource
+def load_stylesheet(path='.streamlit/style.css'):
+    """Read the custom CSS once per process."""
+    with open(path) as f:
+        return f.read()
 
 # Load custom CSS
-with open('.streamlit/style.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+st.markdown(f'<style>{load_stylesheet()}</style>', unsafe_allow_html=True)
 
 # Add custom logo styling
-from visualizations import add_logo_styling
 add_logo_styling()
 
 # Inline SVG logo for Latido - Using a simplified approach that works better with Streamlit
@@ -176,10 +174,10 @@ def main():
     with st.container():
         if use_simulation:
             with st.spinner("🎵 Loading your musical profile..."):
-                # Add small delay to show loading animation
-                time.sleep(1)
-                # Use simulated data
-                data = get_simulated_data(time_range)
+                # Use the shared, precomputed demo snapshot
+                snapshot = get_demo_snapshot(time_range)
+                data = snapshot['data']
+                analysis = snapshot['analysis']
                 profile = data['profile']
                 top_tracks = data['top_tracks']
                 top_artists = data['top_artists']
@@ -187,6 +185,9 @@ def main():
                 recent_tracks = data['recent_tracks']
                 audio_features = data['audio_features']
         else:
+            from spotify_client import create_spotify_client, get_user_profile, fetch_dashboard_data
+            from async_client import ASYNC_BACKEND_ENABLED, fetch_dashboard_data_sync
+
             # Initialize Spotify client and get real data
             try:
                 # Show a customized loading spinner
@@ -204,15 +205,19 @@ def main():
 
                 # Use a different spinner for analyzing music
                 with st.spinner("🎼 Analyzing your musical heartbeat..."):
-                    top_tracks = get_top_tracks(sp, time_range)
-                    top_artists = get_top_artists(sp, time_range)
-                    top_albums = get_top_albums(sp, time_range)
-                    recent_tracks = get_recent_tracks(sp)
-
-                    if all([top_tracks, top_artists, recent_tracks]):
-                        track_ids = [track['id'] for track in top_tracks['items']]
-                        audio_features = get_audio_features(sp, track_ids)
+                    # Independent endpoints are fetched concurrently
+                    if ASYNC_BACKEND_ENABLED:
+                        data, _ = fetch_dashboard_data_sync(sp, time_range)
                     else:
+                        data, _ = fetch_dashboard_data(sp, time_range)
+                    top_tracks = data['top_tracks']
+                    top_artists = data['top_artists']
+                    top_albums = data['top_albums']
+                    recent_tracks = data['recent_tracks']
+                    audio_features = data['audio_features']
+                    analysis = None
+
+                    if not all([top_tracks, top_artists, recent_tracks]):
                         st.error("Failed to fetch your music data. Try using Demo Mode instead.")
                         st.stop()
             except Exception as e:
@@ -237,14 +242,20 @@ def main():
             )
 
         # Process and analyze data
-        audio_features_df = process_audio_features(audio_features)
-        mood_analysis = analyze_mood(audio_features_df)
-        music_patterns = analyze_music_patterns(audio_features_df)
-        genres = get_genre_distribution(top_artists)
-        listening_trends = calculate_listening_trends(recent_tracks)
+        if analysis is None:
+            from analysis import analyze_dashboard
+            # Bucket listening times in the browser's timezone
+            analysis = analyze_dashboard(data, st.context.timezone)
+        audio_features_df = analysis['audio_features_df']
+        feature_summary = analysis['feature_summary']
+        mood_analysis = analysis['mood_analysis']
+        music_patterns = analysis['music_patterns']
+        genres = analysis['genres']
+        listening_trends = analysis['listening_trends']
+        listening_timeline = analysis['listening_timeline']
 
         # AI-powered track clusters
-        track_clusters = cluster_tracks(audio_features_df)
+        track_clusters = analysis['track_clusters']
 
         # Define music personality types based on analysis
         personality_types = {
@@ -274,7 +285,7 @@ def main():
         primary_description = music_personality[primary_trait]
 
         # Get detailed taste analysis
-        taste_profile = analyze_taste_profile(audio_features_df, genres, top_artists)
+        taste_profile = analysis['taste_profile']
 
         # Additional AI insights
         listening_personality = f"Based on your {listening_trends['listening_sessions']} listening sessions, you enjoy {genres[0][0] if genres else 'diverse'} music most during {listening_trends['peak_hour']}:00."
@@ -344,22 +355,43 @@ def main():
         col1, col2 = st.columns(2)
 
         with col1:
-            st.plotly_chart(
-                create_audio_features_radar(audio_features_df),
+            show_chart(
+                audio_features_radar_spec(audio_features_df, feature_summary),
                 use_container_width=use_container_width
             )
 
         with col2:
             # Fix the genre chart error - genres should be a list of tuples
-            st.plotly_chart(
-                create_genre_bar_chart(genres),
+            show_chart(
+                genre_bar_chart_spec(genres),
                 use_container_width=use_container_width
             )
 
-        st.plotly_chart(
-            create_listening_time_chart(recent_tracks),
+        show_chart(
+            listening_time_chart_spec(recent_tracks, listening_timeline),
             use_container_width=True
         )
+
+        # History charts are drawn from fixed-size server-side aggregates
+        history_chart_data = analysis['history_chart_data']
+        col1, col2 = st.columns(2)
+        with col1:
+            show_chart(
+                listening_heatmap_spec(history_chart_data),
+                use_container_width=use_container_width
+            )
+        with col2:
+            if len(history_chart_data['daily_dates']) > 1:
+                show_chart(
+                    play_history_chart_spec(history_chart_data),
+                    use_container_width=use_container_width
+                )
+
+        if len(history_chart_data['trend_dates']) > 1:
+            show_chart(
+                mood_trend_chart_spec(history_chart_data),
+                use_container_width=True
+            )
         st.markdown('</div>', unsafe_allow_html=True)
 
 
@@ -398,15 +430,21 @@ def main():
 
             if use_simulation:
                 # Simulated recommendations
-                recommendations = get_simulated_data(time_range)['recommendations']
+                recommendations = data['recommendations']
             else:
+                from spotify_client import get_recommendations
                 # Get real recommendations with audio features for personalization
                 recommendations = get_recommendations(
                     sp, 
                     seed_tracks=seed_track_ids, 
                     seed_artists=seed_artist_ids,
                     limit=10,
-                    audio_features_df=audio_features_df
+                    audio_features_df=audio_features_df,
+                    feature_summary=feature_summary,
+                    track_clusters=track_clusters,
+                    # Only suggest tracks the user hasn't already played
+                    exclude_ids=[track['id'] for track in top_tracks['items']]
+                    + [item['track']['id'] for item in recent_tracks['items']]
                 )
 
             if recommendations and 'tracks' in recommendations:
@@ -437,5 +475,10 @@ def main():
                                     </div>
                                 ''', unsafe_allow_html=True)
 
+    if use_simulation:
+        # Demo data is built once per process and shared by every session;
+        # the other time ranges are built only after this page has been sent
+        warm_demo_snapshots()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
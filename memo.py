@@ -0,0 +1,181 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+import functools
+import collections
+from cache import connect, data_path
+
+# Results kept in memory, shared by every session in the process
+MEMORY_ENTRIES = int(os.getenv("LATIDO_MEMO_ENTRIES", "256"))
+
+# Results that can be reused by other worker processes and after restarts
+DISK_ENTRIES = int(os.getenv("LATIDO_MEMO_DISK_ENTRIES", "5000"))
+DISK_ENABLED = os.getenv("LATIDO_MEMO_DISK", "1") != "0"
+
+class _HashWriter:
+    """File-like sink that feeds everything pickle writes into a hash."""
+
+    def __init__(self, digest):
+        self.write = digest.update
+
+def content_hash(*values):
+    """Get a hex digest of the content of any picklable values.
+
+    Values are pickled straight into a BLAKE2 hash, so arrays and DataFrames
+    are hashed from their raw buffers without building the pickle in memory.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    pickler = pickle.Pickler(_HashWriter(digest), protocol=pickle.HIGHEST_PROTOCOL)
+    # Without the memo, equal values pickle the same whether or not they
+    # share objects, e.g. a genre string repeated across artists
+    pickler.fast = True
+    pickler.dump(values)
+    return digest.hexdigest()
+
+class MemoCache:
+    """Two-tier cache of function results keyed by the content of their inputs.
+
+    The memory tier is a bounded LRU of live objects. The optional disk tier
+    pickles results into SQLite, with its own LRU cap; only functions whose
+    results don't depend on process-local state should use it. Hits, misses
+    and evictions are counted per function.
+    """
+
+    def __init__(self, max_entries=MEMORY_ENTRIES, disk_path=None, max_disk_entries=DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = collections.Counter()
+        self.disk_hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.evictions = collections.Counter()
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if disk_path:
+            self._conn = connect(disk_path)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)"
+            )
+
+    def get(self, name, key, disk=False):
+        """Return (found, value) for a function's key, checking memory then disk."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits[name] += 1
+                return True, self._entries[key][1]
+
+            if disk and self._conn is not None:
+                row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                    )
+                    value = pickle.loads(row[0])
+                    self._remember(name, key, value)
+                    self.hits[name] += 1
+                    self.disk_hits[name] += 1
+                    return True, value
+
+            self.misses[name] += 1
+            return False, None
+
+    def set(self, name, key, value, disk=False):
+        """Store a result in memory, and on disk if asked, evicting the oldest over the caps."""
+        with self._lock:
+            self._remember(name, key, value)
+            if disk and self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (key, name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+                )
+                count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                if count > self.max_disk_entries:
+                    self._conn.execute(
+                        """DELETE FROM results WHERE key IN (
+                            SELECT key FROM results ORDER BY accessed_at LIMIT ?
+                        )""",
+                        (count - self.max_disk_entries,)
+                    )
+
+    def _remember(self, name, key, value):
+        self._entries[key] = (name, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.evictions[evicted] += 1
+
+    def clear(self):
+        """Remove every memoized result from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM results")
+
+    def stats(self):
+        """Get hit, miss and eviction counters per function along with the entry counts."""
+        with self._lock:
+            disk_entries = None
+            if self._conn is not None:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {
+                'hits': dict(self.hits),
+                'disk_hits': dict(self.disk_hits),
+                'misses': dict(self.misses),
+                'evictions': dict(self.evictions),
+                'entries': len(self._entries),
+                'disk_entries': disk_entries
+            }
+
+_memo_cache = None
+_memo_cache_lock = threading.Lock()
+
+def get_memo_cache():
+    """Get the memoization cache shared by every session in the process."""
+    global _memo_cache
+    with _memo_cache_lock:
+        if _memo_cache is None:
+            _memo_cache = MemoCache(disk_path=data_path("memo.sqlite3") if DISK_ENABLED else None)
+        return _memo_cache
+
+def memoize(disk=False, key=None, version=None):
+    """Memoize a function on a content hash of its arguments.
+
+    key, if given, is called with the arguments and its return value is
+    hashed instead, e.g. to leave out statistics derived from another
+    argument. Bump version when the output changes for the same inputs, so
+    stale results on disk are not reused. Results are shared, so callers
+    must not modify them.
+    """
+    def decorator(func):
+        name = func.__name__
+        prefix = name if version is None else f"{name}@{version}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                digest = f"{prefix}:{content_hash(key(*args, **kwargs) if key else (args, kwargs))}"
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # Arguments that can't be hashed are simply not memoized
+                return func(*args, **kwargs)
+            cache = get_memo_cache()
+            found, value = cache.get(name, digest, disk)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            cache.set(name, digest, value, disk)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
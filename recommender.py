@@ -0,0 +1,233 @@
+import time
+import logging
+import threading
+import collections
+import numpy as np
+from cache import get_audio_feature_store, get_track_store
+from clustering import CLUSTER_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Candidates fetched per query point before re-ranking, per requested track
+CANDIDATES_PER_TRACK = 5
+
+# Weight of dissimilarity to already-picked tracks versus closeness to the user
+DIVERSITY = 0.3
+MAX_PER_ARTIST = 2
+
+# The tree is rebuilt in the background at most this often while new
+# candidates arrive
+REBUILD_INTERVAL = 30
+
+def slim_track(track):
+    """Keep only the fields the recommendation cards display."""
+    album = track.get('album') or {}
+    return {
+        'id': track['id'],
+        'name': track.get('name'),
+        'artists': [{'id': artist.get('id'), 'name': artist.get('name')} for artist in track.get('artists', [])],
+        'album': {'name': album.get('name'), 'images': (album.get('images') or [])[:1]}
+    }
+
+def feature_vector(features):
+    return [features.get(column) or 0.0 for column in CLUSTER_FEATURES]
+
+def rerank(vectors, relevance, artist_ids, limit, diversity=DIVERSITY, max_per_artist=MAX_PER_ARTIST):
+    """Greedily pick relevant tracks that are unlike those already picked (MMR).
+
+    Returns the chosen row positions in pick order.
+    """
+    available = np.ones(len(vectors), dtype=bool)
+    closest_pick = None
+    per_artist = collections.Counter()
+    picked = []
+    while len(picked) < limit and available.any():
+        penalty = 0 if closest_pick is None else closest_pick
+        score = np.where(available, (1 - diversity) * relevance - diversity * penalty, -np.inf)
+        i = int(score.argmax())
+        available[i] = False
+        if per_artist[artist_ids[i]] >= max_per_artist:
+            continue
+        per_artist[artist_ids[i]] += 1
+        picked.append(i)
+        # Similarity is negative distance, so nearby tracks are penalized most
+        similarity = -np.linalg.norm(vectors - vectors[i], axis=1)
+        closest_pick = similarity if closest_pick is None else np.maximum(closest_pick, similarity)
+    return picked
+
+class RecommendationIndex:
+    """KD-tree over the audio features of every track that can be recommended.
+
+    The candidate pool is every track the app has seen with known audio
+    features, across all users. Features are z-scored with the pool's
+    statistics before indexing, so no single feature dominates the distance.
+
+    Queries only read the current snapshot of the indexed pool. Inserts wake
+    a background thread that rebuilds the tree from a copy of the pool and
+    swaps the new snapshot in, so a query never waits for a rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._artist_ids = []
+        self._positions = {}
+        self._rows = []
+        self._snapshot = None
+        self._built_at = 0.0
+        self._changed = threading.Event()
+        self._rebuilder = None
+
+    def add(self, tracks, features_by_id):
+        """Add tracks with known audio features to the pool; returns how many were new."""
+        added = 0
+        with self._lock:
+            for track in tracks:
+                features = features_by_id.get(track.get('id'))
+                if not features or track['id'] in self._positions:
+                    continue
+                self._positions[track['id']] = len(self._ids)
+                self._ids.append(track['id'])
+                artists = track.get('artists') or [{}]
+                self._artist_ids.append(artists[0].get('id'))
+                self._rows.append(feature_vector(features))
+                added += 1
+            if added:
+                self._changed.set()
+                if self._rebuilder is None:
+                    self._rebuilder = threading.Thread(
+                        target=self._rebuild_loop, name="latido-recommendation-index", daemon=True
+                    )
+                    self._rebuilder.start()
+        return added
+
+    def load(self):
+        """Fill the pool from the persistent track and audio-feature stores."""
+        track_ids = get_track_store().keys()
+        if not track_ids:
+            return 0
+        tracks = get_track_store().get_many(track_ids)
+        features = get_audio_feature_store().get_many(track_ids)
+        return self.add(tracks.values(), features)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, track_id):
+        return track_id in self._positions
+
+    def rebuild(self):
+        """Index the current pool and swap the new snapshot in."""
+        with self._lock:
+            if not self._rows:
+                return self._snapshot
+            ids = list(self._ids)
+            positions = dict(self._positions)
+            artist_ids = list(self._artist_ids)
+            vectors = np.asarray(self._rows, dtype=np.float64)
+
+        # scikit-learn takes seconds to import, so it's loaded on first use
+        from sklearn.neighbors import KDTree
+        mean = vectors.mean(axis=0)
+        scale = vectors.std(axis=0)
+        scale[scale == 0] = 1.0
+        normalized = (vectors - mean) / scale
+        snapshot = {
+            'ids': ids,
+            'positions': positions,
+            'artist_ids': artist_ids,
+            'mean': mean,
+            'scale': scale,
+            'vectors': normalized,
+            'tree': KDTree(normalized)
+        }
+        # Queries pick up the new snapshot on their next read
+        self._snapshot = snapshot
+        self._built_at = time.time()
+        return snapshot
+
+    def _rebuild_loop(self):
+        while True:
+            self._changed.wait()
+            # Inserts arriving within the interval are folded into one rebuild
+            delay = self._built_at + REBUILD_INTERVAL - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._changed.clear()
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception("Recommendation index rebuild failed")
+
+    def query(self, points, limit=10, exclude_ids=(), diversity=DIVERSITY):
+        """Get the ids of up to limit diverse tracks near any of the query points."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+
+        points = (np.atleast_2d(np.asarray(points, dtype=np.float64)) - snapshot['mean']) / snapshot['scale']
+        positions = snapshot['positions']
+        excluded = np.array([positions[track_id] for track_id in set(exclude_ids) if track_id in positions], dtype=np.intp)
+        k = min(len(snapshot['ids']), limit * CANDIDATES_PER_TRACK + len(excluded))
+        distances, rows = snapshot['tree'].query(points, k=k)
+        rows, distances = rows.ravel(), distances.ravel()
+
+        # Each candidate's relevance is its closeness to the nearest query point
+        keep = ~np.isin(rows, excluded)
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        candidates, first = np.unique(rows[order], return_index=True)
+        if not len(candidates):
+            return []
+        relevance = -distances[order][first]
+
+        picked = rerank(
+            snapshot['vectors'][candidates], relevance,
+            [snapshot['artist_ids'][row] for row in candidates], limit, diversity
+        )
+        return [snapshot['ids'][candidates[i]] for i in picked]
+
+def remember_candidates(tracks, audio_features):
+    """Add tracks with fetched audio features to the recommendation pool and the track store."""
+    index = get_recommendation_index()
+    features_by_id = {features['id']: features for features in audio_features or [] if features}
+    # Cards need cover art, and known tracks are already stored
+    tracks = [
+        track for track in tracks
+        if track and track.get('id') in features_by_id and track['id'] not in index
+        and (track.get('album') or {}).get('images')
+    ]
+    if not tracks:
+        return 0
+    get_track_store().set_many({track['id']: slim_track(track) for track in tracks})
+    return index.add(tracks, features_by_id)
+
+def recommend_tracks(feature_summary=None, track_clusters=None, exclude_ids=(), limit=10):
+    """Recommend tracks from the local pool near the user's cluster centres or centroid.
+
+    Returns a recommendations-shaped dict, or None when the pool can't fill
+    the request.
+    """
+    points = [cluster['center'] for cluster in track_clusters or [] if cluster.get('center')]
+    if not points and feature_summary is not None:
+        points = [feature_summary.means(CLUSTER_FEATURES)]
+    if not points:
+        return None
+
+    track_ids = get_recommendation_index().query(points, limit, exclude_ids)
+    if len(track_ids) < limit:
+        return None
+    tracks = get_track_store().get_many(track_ids)
+    return {'tracks': [tracks[track_id] for track_id in track_ids if track_id in tracks]}
+
+_recommendation_index = None
+_recommendation_index_lock = threading.Lock()
+
+def get_recommendation_index():
+    """Get the recommendation index shared by the process, loading the stored pool on first use."""
+    global _recommendation_index
+    with _recommendation_index_lock:
+        if _recommendation_index is None:
+            _recommendation_index = RecommendationIndex()
+            _recommendation_index.load()
+        return _recommendation_index
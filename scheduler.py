@@ -0,0 +1,183 @@
+import os
+import time
+import asyncio
+import heapq
+import random
+import itertools
+import threading
+import collections
+import requests
+from spotipy.exceptions import SpotifyException
+
+# Priority classes; lower values are served first
+FOREGROUND = 0
+BACKGROUND = 1
+
+# Process-wide request budget for the app's Spotify credentials
+DEFAULT_RATE = float(os.getenv("LATIDO_SPOTIFY_RATE", "10"))
+DEFAULT_BURST = int(os.getenv("LATIDO_SPOTIFY_BURST", "20"))
+
+# Failures worth another attempt; anything else propagates immediately
+RETRYABLE_ERRORS = (
+    SpotifyException,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout
+)
+
+class RequestScheduler:
+    """Token-bucket scheduler that spaces out Spotify calls and retries throttled ones.
+
+    Every caller takes a token before its request goes out. Waiting callers are
+    queued by priority class, then by arrival, so foreground page loads are
+    served before background prefetches. A 429 response pauses the whole
+    bucket for its Retry-After period, since every session shares the same
+    app credentials, and the call is retried with jittered backoff.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_retries=4,
+                 base_delay=0.5, max_delay=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.counters = collections.Counter()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    def _try_take(self, ticket):
+        """Take a token for a queued ticket; must be called with the lock held.
+
+        Returns 0 once the token is taken, otherwise how long the ticket should
+        wait, or None if it should wait until the queue moves.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        is_next = self._waiting[0] == ticket
+        if is_next and now >= self._paused_until and self._tokens >= 1:
+            heapq.heappop(self._waiting)
+            self._tokens -= 1
+            self.counters['requests'] += 1
+            self._cond.notify_all()
+            return 0
+
+        # The head of the queue sleeps until its token is due;
+        # everyone else waits to be woken when the head moves
+        if not is_next:
+            return None
+        return max(self._paused_until - now, (1 - self._tokens) / self.rate, 0.001)
+
+    def acquire(self, priority=FOREGROUND):
+        """Block until the caller may send one request."""
+        with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                delay = self._try_take(ticket)
+                if delay != 0:
+                    self.counters['queued'] += 1
+                while delay != 0:
+                    self._cond.wait(delay)
+                    delay = self._try_take(ticket)
+            except BaseException:
+                self._dequeue(ticket)
+                raise
+
+    async def acquire_async(self, priority=FOREGROUND):
+        """Wait without blocking the event loop until the caller may send one request."""
+        with self._cond:
+            ticket = self._enqueue(priority)
+            delay = self._try_take(ticket)
+            if delay != 0:
+                self.counters['queued'] += 1
+        try:
+            while delay != 0:
+                # Event-loop callers can't wait on the condition, so they poll
+                await asyncio.sleep(delay if delay is not None else 0.005)
+                with self._cond:
+                    delay = self._try_take(ticket)
+        except BaseException:
+            with self._cond:
+                self._dequeue(ticket)
+            raise
+
+    def pause(self, seconds):
+        """Hold back every caller for the given number of seconds."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """Get a jittered exponential delay for a retry attempt."""
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _retry_delay(self, error, attempt):
+        """Get how long to sleep before retrying a failed call, re-raising it if it shouldn't be."""
+        if isinstance(error, SpotifyException) and error.http_status == 429:
+            with self._cond:
+                self.counters['throttled'] += 1
+            if attempt == self.max_retries:
+                raise error
+            retry_after = (error.headers or {}).get('Retry-After')
+            # The pause applies to every caller, so acquiring the next token waits it out
+            self.pause(float(retry_after) if retry_after else self.backoff(attempt))
+            return 0
+
+        transient = not isinstance(error, SpotifyException) or (error.http_status or 0) >= 500
+        if not transient or attempt == self.max_retries:
+            raise error
+
+        with self._cond:
+            self.counters['retried'] += 1
+        return self.backoff(attempt)
+
+    def call(self, fetch, priority=FOREGROUND):
+        """Run fetch() under the rate limit, retrying throttled and transient failures."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(priority)
+            try:
+                return fetch()
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self._retry_delay(e, attempt))
+
+    async def call_async(self, fetch, priority=FOREGROUND):
+        """Await fetch() under the rate limit, retrying like call()."""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(priority)
+            try:
+                return await fetch()
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+
+    def stats(self):
+        """Get request, queued, throttled and retried counters."""
+        with self._cond:
+            return dict(self.counters, waiting=len(self._waiting))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Get the request scheduler shared by every session in the process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
@@ -3,14 +3,14 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-def generate_simulated_profile():
+def generate_simulated_profile(rng=random):
     """Generate a simulated user profile."""
     return {
         'display_name': 'Demo User',
         'images': [{
             'url': 'https://picsum.photos/200'
         }],
-        'followers': {'total': random.randint(50, 500)},
+        'followers': {'total': rng.randint(50, 500)},
         'country': 'US'
     }
 
@@ -38,20 +38,20 @@ def generate_track(index):
 import random
 from datetime import datetime, timedelta
 
-def generate_audio_features():
+def generate_audio_features(rng=random):
     """Generate simulated audio features."""
     return {
-        'danceability': random.uniform(0.3, 0.9),
-        'energy': random.uniform(0.4, 0.95),
-        'valence': random.uniform(0.2, 0.8),
-        'tempo': random.uniform(70, 180),
-        'acousticness': random.uniform(0.1, 0.9),
-        'instrumentalness': random.uniform(0, 0.8),
-        'liveness': random.uniform(0.1, 0.8),
-        'speechiness': random.uniform(0.03, 0.6)
+        'danceability': rng.uniform(0.3, 0.9),
+        'energy': rng.uniform(0.4, 0.95),
+        'valence': rng.uniform(0.2, 0.8),
+        'tempo': rng.uniform(70, 180),
+        'acousticness': rng.uniform(0.1, 0.9),
+        'instrumentalness': rng.uniform(0, 0.8),
+        'liveness': rng.uniform(0.1, 0.8),
+        'speechiness': rng.uniform(0.03, 0.6)
     }
 
-def generate_track(idx=None):
+def generate_track(idx=None, rng=random):
     """Generate a simulated track."""
     # Sample artist names
     artist_names = ["The Heartbeats", "Rhythm Pulse", "Sonic Wave", "Electric Echo", 
@@ -69,26 +69,26 @@ def generate_track(idx=None):
                    "Pulse", "Rhythm Section", "Beat Patterns"]
     
     # Generate random artist and track details
-    artist_name = random.choice(artist_names)
-    track_name = random.choice(track_names)
-    if random.random() < 0.3:  # Sometimes add a descriptor
-        track_name += f" {random.choice(['Mix', 'Edit', 'Version', 'Remix', 'Reprise'])}"
+    artist_name = rng.choice(artist_names)
+    track_name = rng.choice(track_names)
+    if rng.random() < 0.3:  # Sometimes add a descriptor
+        track_name += f" {rng.choice(['Mix', 'Edit', 'Version', 'Remix', 'Reprise'])}"
     
-    album_name = random.choice(album_names)
+    album_name = rng.choice(album_names)
     
     # Generate a random ID if not provided
     if idx is None:
-        idx = random.randint(100000, 999999)
+        idx = rng.randint(100000, 999999)
     
     # Generate random durations
-    duration_ms = random.randint(180000, 360000)  # 3-6 minutes
+    duration_ms = rng.randint(180000, 360000)  # 3-6 minutes
     
     # Generate track object
     track = {
         'id': f'track_{idx}',
         'name': track_name,
         'duration_ms': duration_ms,
-        'popularity': random.randint(30, 95),
+        'popularity': rng.randint(30, 95),
         'artists': [
             {
                 'id': f'artist_{idx}',
@@ -110,14 +110,14 @@ def generate_track(idx=None):
     
     return track
 
-def generate_recent_tracks(count=50):
+def generate_recent_tracks(count=50, now=None, rng=random):
     """Generate simulated recent tracks with timestamps."""
-    now = datetime.now()
+    now = now or datetime.now()
     tracks = []
 
     for i in range(count):
-        track_time = now - timedelta(hours=random.randint(1, 168))
-        track = generate_track(i)
+        track_time = now - timedelta(hours=rng.randint(1, 168))
+        track = generate_track(i, rng)
         tracks.append({
             'track': track,
             'played_at': track_time.isoformat()
@@ -259,7 +259,7 @@ def get_simulated_data(time_range="medium_term"):
         'recommendations': recommendations
     }
 
-def generate_artist(index):
+def generate_artist(index, rng=random):
     """Generate a simulated artist with genres."""
     genres = ['Pop', 'Rock', 'Hip-Hop', 'Electronic', 'Jazz', 'Classical',
               'Indie', 'Folk', 'R&B', 'Metal', 'Ambient', 'Blues']
@@ -269,14 +269,14 @@ def generate_artist(index):
     return {
         'id': f'artist_{index}',
         'name': f'Artist {index}',
-        'genres': [random.choice(genres)] + random.sample(sub_genres, k=2),
+        'genres': [rng.choice(genres)] + rng.sample(sub_genres, k=2),
         'images': [{
             'url': f'https://picsum.photos/seed/artist_{index}/300'
         }],
-        'popularity': random.randint(30, 100)
+        'popularity': rng.randint(30, 100)
     }
 
-def generate_album(index):
+def generate_album(index, rng=random):
     """Generate a simulated album."""
     album_types = ['Album', 'EP', 'Single', 'Compilation']
     album_names = ['Neon Dreams', 'Digital Horizons', 'Quantum Pulse', 
@@ -284,38 +284,42 @@ def generate_album(index):
 
     return {
         'id': f'album_{index}',
-        'name': f'{random.choice(album_names)} {index}',
-        'album_type': random.choice(album_types),
-        'release_date': f"202{random.randint(0, 3)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
-        'total_tracks': random.randint(5, 15),
+        'name': f'{rng.choice(album_names)} {index}',
+        'album_type': rng.choice(album_types),
+        'release_date': f"202{rng.randint(0, 3)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'total_tracks': rng.randint(5, 15),
         'images': [{
             'url': f'https://picsum.photos/seed/album_{index}/300'
         }],
         'artists': [{
-            'name': f'Artist {random.randint(1, 10)}'
+            'name': f'Artist {rng.randint(1, 10)}'
         }]
     }
 
-def get_simulated_data(time_range='medium_term'):
-    """Get all simulated data for the application."""
+def get_simulated_data(time_range='medium_term', now=None, rng=random):
+    """Get all simulated data for the application.
+
+    Pass a seeded random.Random as rng for reproducible data; by default the
+    shared random module is used.
+    """
     track_count = 20
     artist_count = 20
     album_count = 10
 
-    tracks = [generate_track(i) for i in range(track_count)]
-    artists = [generate_artist(i) for i in range(artist_count)]
-    albums = [generate_album(i) for i in range(album_count)]
-    audio_features = [generate_audio_features() for _ in range(track_count)]
-    profile = generate_simulated_profile()
+    tracks = [generate_track(i, rng) for i in range(track_count)]
+    artists = [generate_artist(i, rng) for i in range(artist_count)]
+    albums = [generate_album(i, rng) for i in range(album_count)]
+    audio_features = [dict(generate_audio_features(rng), id=track['id']) for track in tracks]
+    profile = generate_simulated_profile(rng)
     top_tracks = {'items': tracks}
     top_artists = {'items': artists}
     top_albums = {'items': albums}
-    recent_tracks = generate_recent_tracks()
+    recent_tracks = generate_recent_tracks(now=now, rng=rng)
 
     # Generate simulated recommendations
     recommendations = {
         'tracks': [
-            generate_track(i) 
+            generate_track(i, rng) 
             for i in range(10)
         ]
     }
@@ -328,4 +332,113 @@ def get_simulated_data(time_range='medium_term'):
         'recent_tracks': recent_tracks,
         'audio_features': audio_features,
         'recommendations': recommendations
-    }
\ No newline at end of file
+    }
+
+# Relative listening activity per hour of day: a quiet night, a commute bump
+# and an evening peak
+HOURLY_LISTENING_WEIGHTS = np.array([
+    0.6, 0.4, 0.25, 0.15, 0.1, 0.15, 0.4, 0.9, 1.3, 1.1, 0.9, 0.9,
+    1.0, 1.0, 0.9, 0.9, 1.0, 1.3, 1.6, 1.8, 1.9, 1.8, 1.4, 1.0
+])
+
+BULK_GENRES = np.array([
+    "pop", "rock", "electronic", "indie", "hip-hop", "r&b", "jazz", "classical",
+    "ambient", "folk", "metal", "soul", "blues", "lo-fi", "experimental", "chill",
+    "edm", "synthwave", "house", "techno"
+])
+
+def power_law_weights(count, exponent, rng):
+    """Get Zipf-like selection weights over count items in a random order."""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+def generate_bulk_dataset(n_tracks=100_000, n_artists=10_000, n_plays=1_000_000,
+                          days=365, seed=42, end=None):
+    """Generate a large, reproducible synthetic dataset in one vectorized pass.
+
+    Returns a dict of DataFrames: 'artists', 'tracks', 'audio_features' and
+    'plays'. Artist and track popularity follow power laws, and play times
+    follow a daily listening cycle. The same seed always gives the same data.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or "2025-01-01", tz="UTC")
+
+    # Artists: a few are huge, most are niche
+    artist_weights = power_law_weights(n_artists, 1.1, rng)
+    artist_ids = np.char.add("artist", np.arange(n_artists).astype(str))
+    artists = pd.DataFrame({
+        'id': artist_ids,
+        'genre': BULK_GENRES[rng.integers(0, len(BULK_GENRES), n_artists)],
+        'popularity': np.round(
+            100 * np.log(artist_weights / artist_weights.min())
+            / np.log(artist_weights.max() / artist_weights.min())
+        ).astype(np.int8),
+        'followers': rng.lognormal(9, 2, n_artists).astype(np.int64)
+    })
+
+    # Tracks belong to artists in proportion to artist popularity
+    track_artist = rng.choice(n_artists, size=n_tracks, p=artist_weights)
+    track_ids = np.char.add("track", np.arange(n_tracks).astype(str))
+    tracks = pd.DataFrame({
+        'id': track_ids,
+        'artist_id': artist_ids[track_artist],
+        'duration_ms': np.clip(rng.normal(210_000, 45_000, n_tracks), 60_000, 600_000).astype(np.int32),
+        'popularity': np.clip(
+            artists['popularity'].to_numpy()[track_artist] + rng.normal(0, 10, n_tracks), 0, 100
+        ).astype(np.int8)
+    })
+
+    audio_features = pd.DataFrame({
+        'id': track_ids,
+        'danceability': rng.beta(5, 3, n_tracks).astype(np.float32),
+        'energy': rng.beta(4, 2.5, n_tracks).astype(np.float32),
+        'valence': rng.beta(2.5, 2.5, n_tracks).astype(np.float32),
+        'acousticness': rng.beta(1, 3, n_tracks).astype(np.float32),
+        'instrumentalness': rng.beta(0.4, 4, n_tracks).astype(np.float32),
+        'liveness': rng.beta(1.5, 8, n_tracks).astype(np.float32),
+        'speechiness': rng.beta(1, 12, n_tracks).astype(np.float32),
+        'loudness': np.clip(rng.normal(-8, 4, n_tracks), -60, 0).astype(np.float32),
+        'tempo': np.clip(rng.normal(120, 28, n_tracks), 50, 220).astype(np.float32),
+        'key': rng.integers(0, 12, n_tracks).astype(np.int8),
+        'mode': rng.integers(0, 2, n_tracks).astype(np.int8),
+        'duration_ms': tracks['duration_ms'].to_numpy()
+    })
+
+    # Plays: popular tracks repeat, and times of day follow the daily cycle
+    track_weights = power_law_weights(n_tracks, 0.9, rng)
+    play_tracks = rng.choice(n_tracks, size=n_plays, p=track_weights)
+    hours = rng.choice(24, size=n_plays, p=HOURLY_LISTENING_WEIGHTS / HOURLY_LISTENING_WEIGHTS.sum())
+    offsets_ms = (
+        rng.integers(1, days + 1, n_plays) * 86_400_000
+        - hours * 3_600_000
+        - rng.integers(0, 3_600_000, n_plays)
+    )
+    day_start = end.normalize() + pd.Timedelta(days=1)
+    played_at = pd.to_datetime(day_start.value // 1_000_000 - offsets_ms, unit='ms', utc=True)
+    plays = pd.DataFrame({
+        'played_at': played_at,
+        'track_id': track_ids[play_tracks],
+        'artist_id': artist_ids[track_artist[play_tracks]]
+    }).sort_values('played_at', ascending=False, ignore_index=True)
+
+    return {
+        'artists': artists,
+        'tracks': tracks,
+        'audio_features': audio_features,
+        'plays': plays
+    }
+
+def bulk_recent_tracks(dataset, limit=None):
+    """Shape bulk plays like a recently-played API response for the existing analysis code."""
+    plays = dataset['plays'] if limit is None else dataset['plays'].head(limit)
+    played_at = plays['played_at'].dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return {'items': [
+        {'played_at': timestamp, 'track': {'id': track_id, 'artists': [{'id': artist_id}]}}
+        for timestamp, track_id, artist_id in zip(played_at, plays['track_id'], plays['artist_id'])
+    ]}
+
+def bulk_audio_features(dataset, limit=None):
+    """Shape bulk audio features like the audio-features API response."""
+    features = dataset['audio_features'] if limit is None else dataset['audio_features'].head(limit)
+    return features.to_dict('records')
@@ -1,34 +1,114 @@
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import streamlit as st
+import requests
+import urllib3
 import os
+import time
 import random
+import threading
+import uuid
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from cache import get_response_cache, get_audio_feature_store, get_artist_store, ResponseCache
+from scheduler import get_scheduler, FOREGROUND, BACKGROUND
+from history import get_history_store
+from token_cache import SQLiteCacheHandler, ensure_token_refresher
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Base URL of the Web API; point it at a local stand-in (spotify_stub.py)
+# to benchmark the data layer without spending API quota
+SPOTIFY_API_BASE = os.getenv("SPOTIFY_API_BASE", "https://api.spotify.com/v1/")
+
+# Minimum seconds between recently-played polls for one user
+HISTORY_SYNC_INTERVAL = 2 * 60
+
+# The store keeps every play, but the dashboard only reads this recent window
+HISTORY_WINDOW_DAYS = 365
+HISTORY_MAX_PLAYS = 10000
+
+# Artist genres and popularity drift slowly, so stored details are reused this long
+ARTIST_MAX_AGE = 30 * 24 * 60 * 60
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Get the HTTP session shared by every Spotify client in the process."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            # Only connection errors are retried here; 429s and server errors
+            # are left to the request scheduler so every session backs off together
+            retry = urllib3.Retry(
+                total=3,
+                connect=None,
+                read=False,
+                status=0,
+                respect_retry_after_header=False,
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                backoff_factor=0.3
+            )
+            # Pooled keep-alive connections let reruns skip the TLS handshake
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=32,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
 def get_redirect_uri():
     """Get the appropriate redirect URI based on the environment."""
     # For local development with callback path
     return "http://0.0.0.0:5000/callback"
 
+def create_auth_manager(cache_handler):
+    """Create the OAuth manager for a user's token cache handler."""
+    return SpotifyOAuth(
+        client_id=os.getenv("SPOTIPY_CLIENT_ID"),
+        client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"),
+        redirect_uri=get_redirect_uri(),
+        scope="user-top-read user-read-recently-played user-library-read",
+        show_dialog=True,  # Force display of auth dialog
+        cache_handler=cache_handler,
+        requests_session=get_http_session()
+    )
+
 def create_spotify_client():
     """Create and return an authenticated Spotify client."""
     try:
-        redirect_uri = get_redirect_uri()
+        # Tokens live in the shared store and are renewed in the background,
+        # so a refresh never has to happen inside a page load
+        ensure_token_refresher(create_auth_manager)
+        if 'token_key' not in st.session_state:
+            # Until the profile is known the token is kept under the session
+            st.session_state.token_key = uuid.uuid4().hex
+        cache_handler = SQLiteCacheHandler(st.session_state.token_key)
+        # Only tokens of sessions that are still in use are renewed and kept
+        cache_handler.store.touch(st.session_state.token_key)
+
+        # Reuse the client this session already authenticated
+        sp = st.session_state.get('spotify_client')
+        if sp is not None and cache_handler.get_cached_token():
+            return sp
 
         # Initialize OAuth Manager
-        auth_manager = SpotifyOAuth(
-            client_id=os.getenv("SPOTIPY_CLIENT_ID"),
-            client_secret=os.getenv("SPOTIPY_CLIENT_SECRET"),
-            redirect_uri=redirect_uri,
-            scope="user-top-read user-read-recently-played user-library-read",
-            show_dialog=True  # Force display of auth dialog
-        )
+        auth_manager = create_auth_manager(cache_handler)
+
+        # Hand a token obtained by the sign-in flow over to the shared store
+        if st.session_state.get('token_info') and not cache_handler.get_cached_token():
+            cache_handler.save_token_to_cache(st.session_state.token_info)
 
         # Check if we need to start the auth flow
-        if not st.session_state.get('token_info'):
+        if not cache_handler.get_cached_token():
             # Get the auth URL
             auth_url = auth_manager.get_authorize_url()
 
@@ -56,14 +136,26 @@ def create_spotify_client():
             st.stop()
 
         # Create and return Spotify client
-        sp = spotipy.Spotify(auth_manager=auth_manager)
-        sp.current_user()  # Test the connection
+        sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=get_http_session())
+        sp.prefix = SPOTIFY_API_BASE
+        profile = load_user_profile(sp)  # Test the connection; the profile is kept for get_user_profile
+
+        # The sign-in session's token moves to its user's key, so every
+        # session and worker process of one user shares and renews one token
+        user_key = f"user:{profile['id']}"
+        if cache_handler.key != user_key:
+            cache_handler.store.rekey(cache_handler.key, user_key)
+            cache_handler.key = st.session_state.token_key = user_key
+        st.session_state.spotify_client = sp
         return sp
 
     except Exception as e:
         if "invalid_grant" in str(e):
             # Clear the session state and redirect to login
             st.session_state.token_info = None
+            st.session_state.spotify_client = None
+            if 'token_key' in st.session_state:
+                SQLiteCacheHandler(st.session_state.token_key).store.delete(st.session_state.token_key)
             st.experimental_rerun()
         raise Exception(f"Authentication failed: {str(e)}")
 
@@ -131,41 +223,154 @@ import streamlit as st
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 
-def get_recommendations(sp, seed_tracks=None, seed_artists=None, limit=10, audio_features_df=None):
+class SingleFlight:
+    """Collapse identical concurrent calls into the one already in flight.
+
+    The first caller for a key becomes the leader and runs the call; callers
+    that arrive with the same key before it finishes wait on the leader's
+    Future and get its result or exception. The key is removed once the call
+    completes, so later callers start a fresh request (and normally hit the
+    response cache instead).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.collapsed = 0
+
+    def do(self, key, fetch):
+        """Run fetch() for a key unless an identical call is already in flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.collapsed += 1
+
+        if leader:
+            try:
+                future.set_result(fetch())
+            except BaseException as e:
+                # Followers must never be left waiting, whatever the leader hit
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+
+        return future.result()
+
+    def stats(self):
+        """Get the number of collapsed calls and calls currently in flight."""
+        with self._lock:
+            return {'collapsed': self.collapsed, 'in_flight': len(self._calls)}
+
+_in_flight = SingleFlight()
+
+# Profiles of live clients, fetched once by the connection check
+_profiles = weakref.WeakKeyDictionary()
+
+def load_user_profile(sp):
+    """Get the profile of an authenticated client, fetching it only once."""
+    if sp not in _profiles:
+        _profiles[sp] = scheduled(sp.current_user)
+    return _profiles[sp]
+
+def get_user_id(sp):
+    """Get the Spotify user id of an authenticated client."""
+    return load_user_profile(sp)['id']
+
+def scheduled(fetch, priority=FOREGROUND):
+    """Run a Spotify API call through the process-wide request scheduler."""
+    return get_scheduler().call(fetch, priority)
+
+def cached_call(sp, endpoint, params, fetch, priority=FOREGROUND):
+    """Serve a response from the local cache, scheduling fetch() on a miss.
+
+    Identical misses that overlap, e.g. from a double click or two tabs, share
+    a single request.
+    """
+    user_id = get_user_id(sp)
+    key = ResponseCache.make_key(user_id, endpoint, params)
+    return get_response_cache().get_or_fetch(
+        user_id, endpoint, params,
+        lambda: _in_flight.do(key, lambda: scheduled(fetch, priority))
+    )
+
+def build_recommendation_params(seed_tracks=None, seed_artists=None, limit=10, audio_features_df=None,
+                                feature_summary=None):
+    """Build recommendations request parameters from seeds and the user's audio features."""
+    # Prepare seed parameters
+    params = {'limit': limit}
+
+    if seed_tracks:
+        params['seed_tracks'] = seed_tracks[:5]  # Maximum 5 seeds allowed
+
+    if seed_artists and (not seed_tracks or len(seed_tracks) < 5):
+        max_artists = 5 - (len(seed_tracks) if seed_tracks else 0)
+        params['seed_artists'] = seed_artists[:max_artists]
+
+    # Add audio feature parameters if available for more personalized recommendations
+    if audio_features_df is not None or feature_summary is not None:
+        from features import summarize_features
+
+        # Calculate averages of key audio features
+        summary = summarize_features(audio_features_df, feature_summary)
+        avg_danceability = summary.mean('danceability')
+        avg_energy = summary.mean('energy')
+        avg_valence = summary.mean('valence')
+        avg_tempo = summary.mean('tempo')
+        avg_acousticness = summary.mean('acousticness')
+
+        # Add target parameters based on user's preferences
+        # We add slight variations to discover new but still relevant music
+        params.update({
+            'target_danceability': min(1.0, avg_danceability * random.uniform(0.85, 1.15)),
+            'target_energy': min(1.0, avg_energy * random.uniform(0.85, 1.15)),
+            'target_valence': min(1.0, avg_valence * random.uniform(0.85, 1.15)),
+            'min_tempo': max(0, avg_tempo * 0.85),
+            'max_tempo': avg_tempo * 1.15,
+            'target_acousticness': min(1.0, avg_acousticness * random.uniform(0.85, 1.15))
+        })
+
+    return params
+
+def recommendation_cache_params(params):
+    """Get the cache key parameters of a recommendations request.
+
+    The target jitter is left out so one jittered result is reused until it
+    expires.
+    """
+    return {
+        'seed_tracks': params.get('seed_tracks'),
+        'seed_artists': params.get('seed_artists'),
+        'limit': params['limit']
+    }
+
+def get_recommendations(sp, seed_tracks=None, seed_artists=None, limit=10, audio_features_df=None,
+                        feature_summary=None, track_clusters=None, exclude_ids=None):
     """Get personalized track recommendations based on user's listening patterns."""
     try:
-        # Prepare seed parameters
-        params = {'limit': limit}
-        
-        if seed_tracks:
-            params['seed_tracks'] = seed_tracks[:5]  # Maximum 5 seeds allowed
-        
-        if seed_artists and (not seed_tracks or len(seed_tracks) < 5):
-            max_artists = 5 - (len(seed_tracks) if seed_tracks else 0)
-            params['seed_artists'] = seed_artists[:max_artists]
-        
-        # Add audio feature parameters if available for more personalized recommendations
-        if audio_features_df is not None:
-            # Calculate averages of key audio features
-            avg_danceability = audio_features_df['danceability'].mean()
-            avg_energy = audio_features_df['energy'].mean()
-            avg_valence = audio_features_df['valence'].mean()
-            avg_tempo = audio_features_df['tempo'].mean()
-            avg_acousticness = audio_features_df['acousticness'].mean()
-            
-            # Add target parameters based on user's preferences
-            # We add slight variations to discover new but still relevant music
-            params.update({
-                'target_danceability': min(1.0, avg_danceability * random.uniform(0.85, 1.15)),
-                'target_energy': min(1.0, avg_energy * random.uniform(0.85, 1.15)),
-                'target_valence': min(1.0, avg_valence * random.uniform(0.85, 1.15)),
-                'min_tempo': max(0, avg_tempo * 0.85),
-                'max_tempo': avg_tempo * 1.15,
-                'target_acousticness': min(1.0, avg_acousticness * random.uniform(0.85, 1.15))
-            })
-            
+        # Answer from the local candidate pool when it can fill the request
+        if audio_features_df is not None or feature_summary is not None:
+            from features import summarize_features
+            from recommender import recommend_tracks
+            recommendations = recommend_tracks(
+                summarize_features(audio_features_df, feature_summary), track_clusters,
+                list(exclude_ids or []) + list(seed_tracks or []), limit
+            )
+            if recommendations:
+                return recommendations
+
+        params = build_recommendation_params(
+            seed_tracks, seed_artists, limit, audio_features_df, feature_summary
+        )
+
         # Get recommendations
-        recommendations = sp.recommendations(**params)
+        recommendations = cached_call(
+            sp, 'recommendations', recommendation_cache_params(params),
+            lambda: sp.recommendations(**params)
+        )
         return recommendations
     except Exception as e:
         st.error(f"Error fetching recommendations: {str(e)}")
@@ -173,10 +378,16 @@ def get_recommendations(sp, seed_tracks=None, seed_artists=None, limit=10, audio
 
 # This duplicate method is removed as it's already defined above
 
+def create_token_client(access_token):
+    """Create a client for a fixed access token, e.g. against the local stand-in API."""
+    sp = spotipy.Spotify(auth=access_token, requests_session=get_http_session())
+    sp.prefix = SPOTIFY_API_BASE
+    return sp
+
 def get_user_profile(sp):
     """Get the user's Spotify profile."""
     try:
-        return sp.current_user()
+        return load_user_profile(sp)
     except Exception as e:
         st.error(f"Error fetching user profile: {str(e)}")
         return None
@@ -184,9 +395,9 @@ def get_user_profile(sp):
 def get_top_tracks(sp, time_range="medium_term"):
     """Get the user's top tracks."""
     try:
-        return sp.current_user_top_tracks(
-            limit=50,
-            time_range=time_range
+        return cached_call(
+            sp, 'top_tracks', {'time_range': time_range, 'limit': 50, 'offset': 0},
+            lambda: sp.current_user_top_tracks(limit=50, offset=0, time_range=time_range)
         )
     except Exception as e:
         st.error(f"Error fetching top tracks: {str(e)}")
@@ -195,44 +406,114 @@ def get_top_tracks(sp, time_range="medium_term"):
 def get_top_artists(sp, time_range="medium_term"):
     """Get the user's top artists."""
     try:
-        return sp.current_user_top_artists(
-            limit=50,
-            time_range=time_range
+        return cached_call(
+            sp, 'top_artists', {'time_range': time_range, 'limit': 50, 'offset': 0},
+            lambda: sp.current_user_top_artists(limit=50, offset=0, time_range=time_range)
         )
     except Exception as e:
         st.error(f"Error fetching top artists: {str(e)}")
         return None
 
+def iter_top_pages(sp, kind, time_range="medium_term", max_items=None, page_size=50, max_workers=3):
+    """Yield pages of the user's top tracks or artists in rank order.
+
+    The first page is fetched in the foreground to learn the total. The rest
+    are then requested concurrently as background work, and each page is
+    yielded as soon as it and the pages before it have arrived.
+    """
+    fetch_page = sp.current_user_top_tracks if kind == 'tracks' else sp.current_user_top_artists
+
+    def load(offset, priority):
+        limit = page_size if max_items is None else min(page_size, max_items - offset)
+        return cached_call(
+            sp, f'top_{kind}', {'time_range': time_range, 'limit': limit, 'offset': offset},
+            lambda: fetch_page(limit=limit, offset=offset, time_range=time_range),
+            priority
+        )
+
+    first = load(0, FOREGROUND)
+    if not first or not first['items']:
+        return
+    yield first
+
+    total = first.get('total') or len(first['items'])
+    if max_items is not None:
+        total = min(total, max_items)
+    offsets = range(len(first['items']), total, page_size)
+    if not offsets:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(load, offset, BACKGROUND) for offset in offsets]
+        for future in futures:
+            page = future.result()
+            if not page or not page['items']:
+                break
+            yield page
+
+def iter_top_tracks(sp, time_range="medium_term", max_items=None):
+    """Yield pages of the user's top tracks as they arrive."""
+    return iter_top_pages(sp, 'tracks', time_range, max_items)
+
+def iter_top_artists(sp, time_range="medium_term", max_items=None):
+    """Yield pages of the user's top artists as they arrive."""
+    return iter_top_pages(sp, 'artists', time_range, max_items)
+
+def merge_pages(pages):
+    """Combine paginated responses into a single response-shaped dict."""
+    items = []
+    for page in pages:
+        items.extend(page['items'])
+    return {'items': items, 'total': len(items)} if items else None
+
+def get_all_top_tracks(sp, time_range="medium_term", max_items=None):
+    """Get the user's complete top tracks list across all pages."""
+    try:
+        return merge_pages(iter_top_tracks(sp, time_range, max_items))
+    except Exception as e:
+        st.error(f"Error fetching top tracks: {str(e)}")
+        return None
+
+def get_all_top_artists(sp, time_range="medium_term", max_items=None):
+    """Get the user's complete top artists list across all pages."""
+    try:
+        return merge_pages(iter_top_artists(sp, time_range, max_items))
+    except Exception as e:
+        st.error(f"Error fetching top artists: {str(e)}")
+        return None
+
+def extract_top_albums(top_tracks):
+    """Rank the albums of already fetched top tracks by occurrence."""
+    if not top_tracks:
+        return None
+
+    # Extract album info from tracks
+    albums = {}
+    for track in top_tracks['items']:
+        album = track['album']
+        album_id = album['id']
+
+        # Count album occurrences
+        if album_id in albums:
+            albums[album_id]['count'] += 1
+        else:
+            albums[album_id] = {
+                'album': album,
+                'count': 1
+            }
+
+    # Sort by count
+    sorted_albums = sorted(albums.values(), key=lambda x: x['count'], reverse=True)
+
+    # Format the response like a Spotify API response
+    return {
+        'items': [album['album'] for album in sorted_albums[:20]]
+    }
+
 def get_top_albums(sp, time_range="medium_term"):
     """Extract top albums from top tracks."""
     try:
-        # Get top tracks first
-        top_tracks = get_top_tracks(sp, time_range)
-        if not top_tracks:
-            return None
-            
-        # Extract album info from tracks
-        albums = {}
-        for track in top_tracks['items']:
-            album = track['album']
-            album_id = album['id']
-            
-            # Count album occurrences
-            if album_id in albums:
-                albums[album_id]['count'] += 1
-            else:
-                albums[album_id] = {
-                    'album': album,
-                    'count': 1
-                }
-        
-        # Sort by count
-        sorted_albums = sorted(albums.values(), key=lambda x: x['count'], reverse=True)
-        
-        # Format the response like a Spotify API response
-        return {
-            'items': [album['album'] for album in sorted_albums[:20]]
-        }
+        return extract_top_albums(get_top_tracks(sp, time_range))
     except Exception as e:
         st.error(f"Error processing top albums: {str(e)}")
         return None
@@ -240,28 +521,311 @@ def get_top_albums(sp, time_range="medium_term"):
 def get_recent_tracks(sp):
     """Get the user's recently played tracks."""
     try:
-        return sp.current_user_recently_played(limit=50)
+        return cached_call(
+            sp, 'recent_tracks', {'limit': 50},
+            lambda: sp.current_user_recently_played(limit=50)
+        )
     except Exception as e:
         st.error(f"Error fetching recent tracks: {str(e)}")
         return None
 
+def sync_listening_history(sp, min_interval=HISTORY_SYNC_INTERVAL, max_pages=5):
+    """Append the user's plays since the stored cursor to their local history.
+
+    Each poll asks only for plays after the remembered cursor, so history
+    keeps growing past Spotify's 50-play window while every poll stays small.
+    Returns the number of new plays stored.
+    """
+    store = get_history_store()
+    user_id = get_user_id(sp)
+
+    def sync():
+        after_ms, synced_at = store.get_cursor(user_id)
+        if time.time() - synced_at < min_interval:
+            return 0
+
+        added = 0
+        for _ in range(max_pages):
+            if after_ms is None:
+                # First sync for this user starts from the latest plays
+                response = scheduled(lambda: sp.current_user_recently_played(limit=50))
+            else:
+                response = scheduled(lambda: sp.current_user_recently_played(limit=50, after=after_ms))
+
+            items = response['items'] if response else []
+            added += store.append(user_id, items, after_ms or 0)
+
+            cursor, _ = store.get_cursor(user_id)
+            if len(items) < 50 or cursor == after_ms:
+                break
+            after_ms = cursor
+        return added
+
+    # Two tabs of the same user must not ingest the same window twice
+    return _in_flight.do(('history', user_id), sync)
+
+def history_window_start(window_days=HISTORY_WINDOW_DAYS):
+    """Get the epoch milliseconds of the oldest play the dashboard reads."""
+    return int((time.time() - window_days * 24 * 60 * 60) * 1000)
+
+def get_listening_history(sp):
+    """Get the user's recent stored listening history after syncing new plays.
+
+    Only the last HISTORY_WINDOW_DAYS days, and at most HISTORY_MAX_PLAYS
+    plays, are loaded, so a rerun costs the same however long the stored
+    history grows.
+    """
+    try:
+        sync_listening_history(sp)
+        return get_history_store().load(get_user_id(sp), history_window_start(), HISTORY_MAX_PLAYS)
+    except Exception as e:
+        st.error(f"Error fetching listening history: {str(e)}")
+        return None
+
 def get_audio_features(sp, track_ids):
     """Get audio features for a list of tracks."""
     try:
         if not track_ids:
             return None
-            
+
+        # Audio features never change, so only tracks the store lacks are fetched
+        store = get_audio_feature_store()
+        known = store.get_many(track_ids)
+        missing = [track_id for track_id in dict.fromkeys(track_ids) if track_id not in known]
+
         # Spotify API only allows 100 tracks per request
-        audio_features = []
-        
+        fetched = {}
+
         # Process in batches of 100
-        for i in range(0, len(track_ids), 100):
-            batch = track_ids[i:i+100]
-            batch_features = sp.audio_features(batch)
+        for i in range(0, len(missing), 100):
+            batch = missing[i:i+100]
+            # Users loading the same popular tracks at once share one batch request
+            batch_features = _in_flight.do(
+                ('audio_features', tuple(batch)),
+                lambda: scheduled(lambda: sp.audio_features(batch))
+            )
             if batch_features:
-                audio_features.extend(batch_features)
-        
-        return audio_features
+                fetched.update((features['id'], features) for features in batch_features if features)
+
+        store.set_many(fetched)
+        known.update(fetched)
+
+        # Keep the request order; tracks without features stay None as in the API
+        return [known.get(track_id) for track_id in track_ids]
     except Exception as e:
         st.error(f"Error fetching audio features: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def get_unclustered_features(sp, recent_tracks):
+    """Get audio features for listened tracks the user's cluster model hasn't seen yet."""
+    # The analytics modules load pandas and numpy, so the login path skips them
+    from clustering import get_cluster_engine
+
+    track_ids = [item['track']['id'] for item in recent_tracks['items']]
+    unseen = get_cluster_engine().unseen(get_user_id(sp), track_ids)
+    return (get_audio_features(sp, unseen) or []) if unseen else []
+
+def get_stored_history_features(results):
+    """Get stored audio features for history tracks neither features response covers.
+
+    These are tracks fetched on earlier loads. Looking them up here makes
+    them part of the fetched data, so the analysis never reads the store.
+    """
+    fetched = {
+        features['id'] for features in (results['audio_features'] or []) + (results['history_features'] or [])
+        if features
+    }
+    items = results['recent_tracks']['items'] if results.get('recent_tracks') else []
+    missing = sorted({item['track'].get('id') for item in items} - fetched - {None})
+    if not missing:
+        return []
+    known = get_audio_feature_store().get_many(missing)
+    return [known[track_id] for track_id in missing if track_id in known]
+
+def add_recommendation_candidates(results):
+    """Add the loaded tracks with audio features to the local recommendation pool."""
+    from recommender import remember_candidates
+
+    tracks = list((results['top_tracks'] or {}).get('items', []))
+    tracks += [item['track'] for item in (results['recent_tracks'] or {}).get('items', [])]
+    return remember_candidates(tracks, (results['audio_features'] or []) + (results['history_features'] or []))
+
+def collect_artist_ids(*track_lists):
+    """Get the unique artist ids across top-track and listening-history responses."""
+    artist_ids = {}
+    for tracks in track_lists:
+        if not tracks or 'items' not in tracks:
+            continue
+        for item in tracks['items']:
+            # History items wrap the track; top-track items are the track itself
+            track = item.get('track', item)
+            for artist in track.get('artists', []):
+                if artist.get('id'):
+                    artist_ids[artist['id']] = True
+    return list(artist_ids)
+
+def remember_artists(artists):
+    """Store the genres and popularity of full artist objects already fetched."""
+    details = {
+        artist['id']: {
+            'name': artist.get('name'),
+            'genres': artist.get('genres', []),
+            'popularity': artist.get('popularity'),
+            'fetched_at': time.time()
+        }
+        for artist in artists if artist
+    }
+    get_artist_store().set_many(details)
+    return details
+
+def remember_top_artists(artists):
+    """Store top artists the artist store lacks or holds stale details for.
+
+    Fresh entries keep their fetched_at, so a rerun writes nothing.
+    """
+    artists = [artist for artist in artists if artist and artist.get('id')]
+    now = time.time()
+    stored = get_artist_store().get_many([artist['id'] for artist in artists])
+    fresh = {artist_id for artist_id, details in stored.items() if now - details['fetched_at'] < ARTIST_MAX_AGE}
+    return remember_artists([artist for artist in artists if artist['id'] not in fresh])
+
+def resolve_artists(sp, artist_ids, priority=FOREGROUND, max_workers=3):
+    """Get genres and popularity for many artists in as few requests as possible.
+
+    Ids are deduplicated, fresh entries come from the shared artist store, and
+    the rest are looked up 50 at a time through the several-artists endpoint,
+    with the batches requested concurrently. Returns a dict of artist id to
+    details.
+    """
+    artist_ids = list(dict.fromkeys(artist_ids))
+    now = time.time()
+    known = {
+        artist_id: details for artist_id, details in get_artist_store().get_many(artist_ids).items()
+        if now - details['fetched_at'] < ARTIST_MAX_AGE
+    }
+    missing = [artist_id for artist_id in artist_ids if artist_id not in known]
+
+    def load(batch):
+        return _in_flight.do(
+            ('artists', tuple(batch)),
+            lambda: scheduled(lambda: sp.artists(batch), priority)
+        )
+
+    # Spotify API only allows 50 artists per request
+    batches = [missing[i:i+50] for i in range(0, len(missing), 50)]
+    if len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(load, batches))
+    else:
+        responses = [load(batch) for batch in batches]
+
+    for response in responses:
+        if response:
+            known.update(remember_artists(response['artists']))
+    return known
+
+def get_artist_index(sp, top_tracks, recent_tracks, top_artists=None, priority=FOREGROUND):
+    """Get an artist id to genres index covering every loaded track's artists."""
+    try:
+        # Top artists arrive with their genres, so they never need a lookup
+        if top_artists and 'items' in top_artists:
+            remember_top_artists(top_artists['items'])
+        return resolve_artists(sp, collect_artist_ids(top_tracks, recent_tracks), priority)
+    except Exception as e:
+        st.error(f"Error fetching artist details: {str(e)}")
+        return None
+
+def fetch_dashboard_data(sp, time_range="medium_term", max_workers=4):
+    """Fetch everything the dashboard needs from Spotify concurrently.
+
+    The complete top tracks and top artists lists and the listening-history
+    sync are requested at the same time on a bounded thread pool. The
+    audio-features request starts as soon as the top tracks arrive, and the
+    artist-genre lookup as soon as all three lists are in, so a cold load
+    costs roughly the slowest chain of calls instead of the sum of all of
+    them. Top albums are derived from the top tracks rather than fetched
+    again.
+
+    Returns a (results, errors) pair of dicts keyed by endpoint name. A failed
+    endpoint maps to None in results and to an error message in errors.
+    """
+    ctx = get_script_run_ctx()
+
+    def run(fetch, *args):
+        # Worker threads need the script context for the getters' st.error calls
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fetch(*args)
+
+    results = {'audio_features': None, 'history_features': None}
+    errors = {}
+    lists = ('top_tracks', 'top_artists', 'recent_tracks')
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run, get_all_top_tracks, sp, time_range): 'top_tracks',
+            executor.submit(run, get_all_top_artists, sp, time_range): 'top_artists',
+            executor.submit(run, get_listening_history, sp): 'recent_tracks'
+        }
+        pending = set(futures)
+        artist_index_started = False
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = None
+                    errors[name] = str(e)
+                    continue
+
+                if results[name] is None:
+                    errors[name] = "No data returned"
+                elif name == 'top_tracks':
+                    # Audio features only depend on the top tracks
+                    track_ids = [track['id'] for track in results[name]['items']]
+                    feature_future = executor.submit(run, get_audio_features, sp, track_ids)
+                    futures[feature_future] = 'audio_features'
+                    pending.add(feature_future)
+                elif name == 'recent_tracks':
+                    # New history tracks feed the user's incremental clusters
+                    history_future = executor.submit(run, get_unclustered_features, sp, results[name])
+                    futures[history_future] = 'history_features'
+                    pending.add(history_future)
+
+            if not artist_index_started and all(name in results for name in lists):
+                # Genres for every loaded track's artists, in a handful of
+                # batched calls alongside the audio-features requests
+                artist_index_started = True
+                artist_future = executor.submit(
+                    run, get_artist_index, sp,
+                    results['top_tracks'], results['recent_tracks'], results['top_artists']
+                )
+                futures[artist_future] = 'artist_index'
+                pending.add(artist_future)
+
+    try:
+        results['top_albums'] = extract_top_albums(results['top_tracks'])
+    except Exception as e:
+        results['top_albums'] = None
+        errors['top_albums'] = str(e)
+
+    try:
+        results['stored_history_features'] = get_stored_history_features(results)
+    except Exception as e:
+        results['stored_history_features'] = None
+        errors['stored_history_features'] = str(e)
+
+    try:
+        results['user_id'] = get_user_id(sp)
+    except Exception as e:
+        results['user_id'] = None
+        errors['user_id'] = str(e)
+
+    try:
+        add_recommendation_candidates(results)
+    except Exception as e:
+        errors['recommendation_candidates'] = str(e)
+
+    return results, errors
@@ -0,0 +1,192 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from simulation import (
+    generate_simulated_profile, generate_track, generate_artist, generate_audio_features
+)
+
+class StubConfig:
+    """Behaviour knobs for the stand-in API."""
+
+    def __init__(self, latency_ms=80, jitter_ms=40, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, top_total=150, play_interval=180, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.top_total = top_total
+        self.play_interval = play_interval
+        self.random = random.Random(seed)
+
+def index_of(item_id):
+    """Get the simulation index encoded in an id like track_12, or a stable hash of it."""
+    match = re.search(r'(\d+)$', item_id)
+    return int(match.group(1)) if match else abs(hash(item_id)) % 100000
+
+def to_api_ids(body):
+    """Rewrite simulation ids like track_12 into base-62 ids like track12 that spotipy accepts."""
+    if isinstance(body, list):
+        return [to_api_ids(item) for item in body]
+    if isinstance(body, dict):
+        return {
+            key: value.replace('_', '') if key == 'id' and isinstance(value, str) else to_api_ids(value)
+            for key, value in body.items()
+        }
+    return body
+
+def user_id_for(headers):
+    """Derive a stable user id from the bearer token, so each token is its own user."""
+    token = headers.get('Authorization', '').replace('Bearer ', '').strip()
+    return f"user_{token or 'anonymous'}"
+
+def top_page(kind, query, config):
+    limit = int(query.get('limit', ['20'])[0])
+    offset = int(query.get('offset', ['0'])[0])
+    indexes = range(offset, min(offset + limit, config.top_total))
+    make = generate_track if kind == 'tracks' else generate_artist
+    return {
+        'items': [make(i) for i in indexes],
+        'total': config.top_total,
+        'limit': limit,
+        'offset': offset
+    }
+
+def recently_played(query, config):
+    """Plays at a fixed interval up to now, so `after` polls see only newer plays."""
+    limit = int(query.get('limit', ['50'])[0])
+    after = int(query['after'][0]) if 'after' in query else None
+    now = int(time.time()) // config.play_interval * config.play_interval
+
+    items = []
+    for step in range(limit):
+        played_at = now - step * config.play_interval
+        if after is not None and played_at * 1000 <= after:
+            break
+        items.append({
+            'track': generate_track(played_at // config.play_interval % 500),
+            'played_at': datetime.fromtimestamp(played_at, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        })
+
+    cursors = None
+    if items:
+        cursors = {'after': str(now * 1000), 'before': str((now - (len(items) - 1) * config.play_interval) * 1000)}
+    return {'items': items, 'limit': limit, 'cursors': cursors}
+
+def audio_features(query):
+    ids = query.get('ids', [''])[0].split(',')
+    features = []
+    for track_id in ids:
+        item = generate_audio_features()
+        item['id'] = track_id
+        features.append(item)
+    return {'audio_features': features}
+
+def artists(query):
+    ids = query.get('ids', [''])[0].split(',')
+    items = []
+    for artist_id in ids:
+        artist = generate_artist(index_of(artist_id))
+        artist['id'] = artist_id
+        items.append(artist)
+    return {'artists': items}
+
+def recommendations(query):
+    limit = int(query.get('limit', ['20'])[0])
+    return {'tracks': [generate_track() for _ in range(limit)], 'seeds': []}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves the Spotify Web API endpoints spotify_client.py uses."""
+
+    config = StubConfig()
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        config = self.config
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        query = parse_qs(url.query)
+
+        delay = config.latency_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+
+        roll = config.random.random()
+        if roll < config.throttle_rate:
+            return self.send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                                  {'Retry-After': str(config.retry_after)})
+        if roll < config.throttle_rate + config.error_rate:
+            return self.send_json(500, {'error': {'status': 500, 'message': 'Server error'}})
+
+        if path == '/v1/me':
+            profile = generate_simulated_profile()
+            profile['id'] = user_id_for(self.headers)
+            body = profile
+        elif path == '/v1/me/top/tracks':
+            body = top_page('tracks', query, config)
+        elif path == '/v1/me/top/artists':
+            body = top_page('artists', query, config)
+        elif path == '/v1/me/player/recently-played':
+            body = recently_played(query, config)
+        elif path == '/v1/audio-features':
+            body = audio_features(query)
+        elif path == '/v1/artists':
+            body = artists(query)
+        elif path == '/v1/recommendations':
+            body = recommendations(query)
+        else:
+            return self.send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+        self.send_json(200, to_api_ids(body))
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """Start the stand-in API on a background thread; returns (server, base_url)."""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="latido-spotify-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Spotify Web API stand-in backed by simulation.py")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--jitter-ms', type=float, default=40)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--top-total', type=int, default=150)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        top_total=args.top_total, seed=args.seed
+    )
+    server = ThreadingHTTPServer((args.host, args.port), type('ConfiguredStubHandler', (StubHandler,), {'config': config}))
+    print(f"Spotify stand-in listening on http://{args.host}:{args.port}/v1/")
+    print(f"Point the app at it with SPOTIFY_API_BASE=http://{args.host}:{args.port}/v1/")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import spotify_client
+from memo import content_hash
+from spotify_stub import StubConfig, start_stub_server
+
+@pytest.fixture
+def sp(tmp_path, monkeypatch):
+    """A client for the stand-in API, with the local stores in a fresh directory."""
+    monkeypatch.setattr(cache, 'DATA_DIR', str(tmp_path))
+    # A play a day keeps the history from growing between loads
+    server, api_base = start_stub_server(StubConfig(latency_ms=0, jitter_ms=0, play_interval=24 * 60 * 60))
+    monkeypatch.setattr(spotify_client, 'SPOTIFY_API_BASE', api_base)
+    yield spotify_client.create_token_client("dashboard-key-test")
+    server.shutdown()
+
+def test_identical_loads_share_a_key(sp):
+    from analysis import analyze_dashboard, dashboard_key
+
+    first, errors = spotify_client.fetch_dashboard_data(sp)
+    assert not errors
+    # The first analysis folds the history into the cluster model, so the
+    # second load gets its features from the store instead of the fetch
+    analyze_dashboard(first)
+    second, errors = spotify_client.fetch_dashboard_data(sp)
+    assert not errors
+
+    assert first['history_features'] != second['history_features']
+    assert content_hash(dashboard_key(first)) == content_hash(dashboard_key(second))
+
+def test_reloads_keep_fresh_artist_details(sp):
+    first, _ = spotify_client.fetch_dashboard_data(sp)
+    second, _ = spotify_client.fetch_dashboard_data(sp)
+
+    artist_id = first['top_artists']['items'][0]['id']
+    assert second['artist_index'][artist_id]['fetched_at'] == first['artist_index'][artist_id]['fetched_at']
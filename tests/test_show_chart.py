@@ -0,0 +1,41 @@
+import os
+import pytest
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def chart_script(root, use_show_chart):
+    import sys
+    sys.path.insert(0, root)
+    import plotly.graph_objects as go
+    import streamlit as st
+    from visualizations import figure_json, show_chart
+
+    fig = go.Figure(go.Scatter(x=[1, 2, 3], y=[3, 1, 2], mode='lines'))
+    if use_show_chart:
+        def fallback(*args, **kwargs):
+            raise AssertionError("show_chart fell back to st.plotly_chart")
+        # Only the hand-built message is compared, never the fallback
+        plotly_chart, st.plotly_chart = st.plotly_chart, fallback
+        try:
+            show_chart(figure_json(fig))
+        finally:
+            st.plotly_chart = plotly_chart
+    else:
+        st.plotly_chart(fig, use_container_width=True)
+
+def render(use_show_chart):
+    at = AppTest.from_function(chart_script, args=(ROOT, use_show_chart), default_timeout=30)
+    at.run()
+    assert not at.exception
+    charts = at.get("plotly_chart")
+    assert len(charts) == 1
+    return charts[0].proto
+
+def test_show_chart_matches_plotly_chart():
+    # show_chart builds st.plotly_chart's message by hand; a Streamlit
+    # upgrade that changes either the message or its element id fails here
+    shown, plotted = render(True), render(False)
+    assert shown.id == plotted.id
+    assert shown.spec == plotted.spec
+    assert shown.config == plotted.config
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spotify_client import SingleFlight
+
+CALLERS = 8
+
+def run_concurrently(flight, fetch, key='key'):
+    """Call flight.do(key, fetch) from CALLERS threads at once; returns each caller's outcome."""
+    outcomes = [None] * CALLERS
+
+    def call(i):
+        try:
+            outcomes[i] = ('result', flight.do(key, fetch))
+        except Exception as e:
+            outcomes[i] = ('error', e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+def blocking_fetch(result=None, error=None):
+    """A fetch that waits until released, so every caller joins the one in flight."""
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        assert release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    return fetch, started, release, calls
+
+def wait_for_followers(flight, count, timeout=5):
+    """Wait until count callers have joined the call in flight."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if flight.stats()['collapsed'] >= count:
+            return
+        time.sleep(0.01)
+    pytest.fail(f"only {flight.stats()['collapsed']} of {count} callers joined the call in flight")
+
+def test_concurrent_calls_fetch_once_and_share_the_result():
+    flight = SingleFlight()
+    result = {'items': [1, 2, 3]}
+    fetch, started, release, calls = blocking_fetch(result=result)
+
+    threads, outcomes = run_concurrently(flight, fetch)
+    assert started.wait(5)
+    wait_for_followers(flight, CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert all(outcome == ('result', result) for outcome in outcomes)
+    assert all(outcome[1] is result for outcome in outcomes)
+    assert flight.stats() == {'collapsed': CALLERS - 1, 'in_flight': 0}
+
+def test_concurrent_calls_all_get_the_exception():
+    flight = SingleFlight()
+    error = RuntimeError("rate limited")
+    fetch, started, release, calls = blocking_fetch(error=error)
+
+    threads, outcomes = run_concurrently(flight, fetch)
+    assert started.wait(5)
+    wait_for_followers(flight, CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert all(outcome == ('error', error) for outcome in outcomes)
+    assert flight.stats()['in_flight'] == 0
+
+def test_later_calls_start_a_fresh_fetch():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do('key', fetch) == 1
+    assert flight.do('key', fetch) == 2
+    assert flight.stats() == {'collapsed': 0, 'in_flight': 0}
+
+def test_different_keys_do_not_collapse():
+    flight = SingleFlight()
+    fetch, started, release, calls = blocking_fetch(result='a')
+
+    threads, outcomes = run_concurrently(flight, fetch, key='a')
+    assert started.wait(5)
+    wait_for_followers(flight, CALLERS - 1)
+    assert flight.do('b', lambda: 'b') == 'b'
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert all(outcome == ('result', 'a') for outcome in outcomes)
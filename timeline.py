@@ -0,0 +1,73 @@
+import calendar
+import warnings
+import numpy as np
+import pandas as pd
+
+# Plays further apart than this start a new listening session
+SESSION_GAP_MINUTES = 30
+
+def parse_played_at(recent_tracks, tz=None):
+    """Parse every played_at of a recently-played response at once.
+
+    Returns a tz-aware DatetimeIndex in the given timezone (UTC by default).
+    Timestamps without an offset are taken as UTC.
+    """
+    items = recent_tracks['items'] if recent_tracks and 'items' in recent_tracks else []
+    try:
+        # NumPy parses plain ISO timestamps several times faster than pandas;
+        # anything with an explicit offset falls through to pandas
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            values = np.array([item['played_at'].rstrip('Z') for item in items], dtype='datetime64[us]')
+        times = pd.DatetimeIndex(values).tz_localize('UTC')
+    except (ValueError, DeprecationWarning, UserWarning):
+        times = pd.to_datetime([item['played_at'] for item in items], utc=True, format='ISO8601')
+    return times.tz_convert(tz) if tz else times
+
+class ListeningTimeline:
+    """Hour, weekday and session statistics of a listening history.
+
+    Built once per dataset from the parsed play times and shared by the
+    listening-trend analysis and the listening-time chart. Hours and weekdays
+    are local to the timezone the times were parsed in; sessions are runs of
+    plays with no gap longer than gap_minutes.
+    """
+
+    def __init__(self, times, gap_minutes=SESSION_GAP_MINUTES):
+        self.times = times
+        hours = times.hour.to_numpy()
+        weekdays = times.dayofweek.to_numpy()
+        # Plays per (weekday, hour) bin, Monday first
+        self.hour_weekday_counts = np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24)
+
+        played = np.sort(times.as_unit("ns").asi8)
+        breaks = np.flatnonzero(np.diff(played) > gap_minutes * 60 * 10**9)
+        starts = np.concatenate([[0], breaks + 1]) if len(played) else np.array([], dtype=int)
+        ends = np.concatenate([breaks, [len(played) - 1]]) if len(played) else np.array([], dtype=int)
+        self.session_plays = ends - starts + 1
+        self.session_minutes = (played[ends] - played[starts]) / (60 * 10**9)
+
+    @classmethod
+    def from_recent_tracks(cls, recent_tracks, tz=None, gap_minutes=SESSION_GAP_MINUTES):
+        return cls(parse_played_at(recent_tracks, tz), gap_minutes)
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def session_count(self):
+        return len(self.session_plays)
+
+    def hour_counts(self):
+        """Get plays per hour of day, 0-23."""
+        return self.hour_weekday_counts.sum(axis=0)
+
+    def weekday_counts(self):
+        """Get plays per weekday, Monday first."""
+        return self.hour_weekday_counts.sum(axis=1)
+
+    def peak_hour(self):
+        return int(self.hour_counts().argmax())
+
+    def favorite_day(self):
+        return calendar.day_name[int(self.weekday_counts().argmax())]
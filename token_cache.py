@@ -0,0 +1,193 @@
+import json
+import time
+import logging
+import threading
+from spotipy.cache_handler import CacheHandler
+from cache import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# Tokens are renewed this many seconds before they expire, well ahead of
+# spotipy's own 60-second inline refresh
+REFRESH_MARGIN = 5 * 60
+REFRESH_INTERVAL = 30
+
+# Tokens are keyed by Spotify user once signed in, so one that hasn't been
+# used for a while belongs to a user who stopped visiting. Idle tokens stop
+# being renewed (spotipy refreshes inline if the user comes back) and are
+# eventually dropped.
+REFRESH_IDLE_TTL = 60 * 60
+TOKEN_IDLE_TTL = 7 * 24 * 60 * 60
+
+class TokenStore:
+    """OAuth tokens for every signed-in user, shared by all worker processes."""
+
+    def __init__(self, path=None):
+        self.path = path or data_path("tokens.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                key TEXT PRIMARY KEY,
+                token_info TEXT NOT NULL,
+                expires_at INTEGER NOT NULL,
+                refreshing_until REAL NOT NULL DEFAULT 0,
+                last_used_at REAL NOT NULL DEFAULT 0
+            )
+        """)
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token_info FROM tokens WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, key, token_info):
+        """Store a token; a background refresh keeps the token's last use."""
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO tokens (key, token_info, expires_at, last_used_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                       token_info = excluded.token_info,
+                       expires_at = excluded.expires_at,
+                       refreshing_until = 0""",
+                (key, json.dumps(token_info), token_info['expires_at'], time.time())
+            )
+
+    def touch(self, key):
+        """Record that a session is using its token, so it keeps being renewed."""
+        with self._lock:
+            self._conn.execute("UPDATE tokens SET last_used_at = ? WHERE key = ?", (time.time(), key))
+
+    def rekey(self, key, new_key):
+        """Move a token to a new key, replacing any token already stored there."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    """INSERT OR REPLACE INTO tokens (key, token_info, expires_at, refreshing_until, last_used_at)
+                       SELECT ?, token_info, expires_at, refreshing_until, last_used_at FROM tokens WHERE key = ?""",
+                    (new_key, key)
+                )
+                self._conn.execute("DELETE FROM tokens WHERE key = ?", (key,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM tokens WHERE key = ?", (key,))
+
+    def prune(self, idle_ttl=TOKEN_IDLE_TTL):
+        """Delete tokens no session has used within idle_ttl; returns how many were removed."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM tokens WHERE last_used_at < ?", (time.time() - idle_ttl,)
+            ).rowcount
+
+    def claim_expiring(self, margin=REFRESH_MARGIN, lease=60, idle_ttl=REFRESH_IDLE_TTL):
+        """Claim recently used tokens that expire within the margin so only one process refreshes each."""
+        now = time.time()
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT key FROM tokens WHERE expires_at < ? AND refreshing_until < ? AND last_used_at >= ?",
+                (now + margin, now, now - idle_ttl)
+            ).fetchall()]
+
+            claimed = []
+            for key in keys:
+                cursor = self._conn.execute(
+                    "UPDATE tokens SET refreshing_until = ? WHERE key = ? AND refreshing_until < ?",
+                    (now + lease, key, now)
+                )
+                if cursor.rowcount:
+                    claimed.append(key)
+        return claimed
+
+class SQLiteCacheHandler(CacheHandler):
+    """spotipy cache handler that keeps one user's token in the shared token store."""
+
+    def __init__(self, key, store=None):
+        self.key = key
+        self.store = store or get_token_store()
+
+    def get_cached_token(self):
+        return self.store.get(self.key)
+
+    def save_token_to_cache(self, token_info):
+        self.store.save(self.key, token_info)
+
+class TokenRefresher:
+    """Background thread that renews stored tokens shortly before they expire.
+
+    make_auth_manager(cache_handler) must return a SpotifyOAuth bound to the
+    given handler; it is used to refresh and save each claimed token.
+    """
+
+    def __init__(self, make_auth_manager, store=None, interval=REFRESH_INTERVAL, margin=REFRESH_MARGIN):
+        self.make_auth_manager = make_auth_manager
+        self.store = store or get_token_store()
+        self.interval = interval
+        self.margin = margin
+        self.refreshed = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="latido-token-refresher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh_due(self):
+        """Refresh every token this process claimed; returns how many were renewed."""
+        renewed = 0
+        for key in self.store.claim_expiring(self.margin):
+            token_info = self.store.get(key)
+            if not token_info:
+                continue
+            try:
+                auth_manager = self.make_auth_manager(SQLiteCacheHandler(key, self.store))
+                auth_manager.refresh_access_token(token_info['refresh_token'])
+                renewed += 1
+            except Exception as e:
+                self.failed += 1
+                if "invalid_grant" in str(e):
+                    # The grant was revoked; the user has to sign in again
+                    self.store.delete(key)
+                logger.warning("Token refresh failed: %s", e)
+        self.refreshed += renewed
+        return renewed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_due()
+                self.store.prune()
+            except Exception:
+                logger.exception("Token refresher pass failed")
+
+_token_store = None
+_token_refresher = None
+_token_lock = threading.Lock()
+
+def get_token_store():
+    """Get the process-wide token store."""
+    global _token_store
+    with _token_lock:
+        if _token_store is None:
+            _token_store = TokenStore()
+        return _token_store
+
+def ensure_token_refresher(make_auth_manager):
+    """Start the process-wide background token refresher if it isn't running yet."""
+    global _token_refresher
+    store = get_token_store()
+    with _token_lock:
+        if _token_refresher is None:
+            _token_refresher = TokenRefresher(make_auth_manager, store).start()
+        return _token_refresher
@@ -1,9 +1,77 @@
+import json
+import calendar
+import functools
 import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-from datetime import datetime
+import plotly.io as pio
 import numpy as np
 import streamlit as st
+from memo import memoize
+
+CHART_THEME = "plotly_dark"
+
+RADAR_FEATURES = ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness']
+
+# Bump when chart output changes, so cached specs on disk are rebuilt
+CHART_VERSION = 4
+
+# Same options and selection modes st.plotly_chart uses by default; both
+# are part of the chart's element id
+CHART_CONFIG = json.dumps({'showLink': False, 'linkText': False})
+PLOTLY_SELECTION_MODE = ("points", "box", "lasso")
+
+@functools.lru_cache(maxsize=None)
+def template_json(theme):
+    return pio.templates[theme].to_plotly_json()
+
+def figure_json(fig, theme=None):
+    """Serialize a figure the way st.plotly_chart does.
+
+    Applying a template to a figure deep-copies and validates all of it,
+    which costs far more than the chart itself; a figure built without a
+    theme can have the theme's template added to its JSON instead.
+    """
+    if theme is None:
+        return pio.to_json(fig, validate=False)
+    spec = fig.to_plotly_json()
+    spec['layout']['template'] = template_json(theme)
+    return pio.to_json(spec, validate=False)
+
+def show_chart(spec, use_container_width=True):
+    """Display a pre-serialized figure without rebuilding or re-encoding it.
+
+    Builds the same message and element id as st.plotly_chart with its
+    defaults, using Streamlit internals (checked against 1.43). If those
+    differ in the installed version, the chart is rebuilt from the spec and
+    shown with st.plotly_chart instead.
+    """
+    try:
+        from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+        from streamlit.elements.lib.form_utils import current_form_id
+        from streamlit.elements.lib.utils import compute_and_register_element_id
+
+        # Everything that can fail is looked up before the element id is
+        # registered, so the fallback never sees a duplicate id
+        enqueue = st._main._enqueue
+        proto = PlotlyChartProto()
+        proto.use_container_width = use_container_width
+        proto.theme = "streamlit"
+        proto.form_id = current_form_id(st._main)
+        proto.spec = spec
+        proto.config = CHART_CONFIG
+        proto.id = compute_and_register_element_id(
+            "plotly_chart",
+            user_key=None,
+            form_id=proto.form_id,
+            plotly_spec=proto.spec,
+            plotly_config=proto.config,
+            selection_mode=PLOTLY_SELECTION_MODE,
+            is_selection_activated=False,
+            theme="streamlit",
+            use_container_width=use_container_width,
+        )
+    except (ImportError, AttributeError, TypeError):
+        return st.plotly_chart(pio.from_json(spec), use_container_width=use_container_width)
+    return enqueue("plotly_chart", proto)
 
 def add_logo_styling():
     """Add custom CSS to fix logo alignment issues"""
@@ -32,33 +100,30 @@ def add_logo_styling():
         </style>
     """, unsafe_allow_html=True)
 
-def create_audio_features_radar(audio_features_df):
+def create_audio_features_radar(audio_features_df, feature_summary=None, theme=CHART_THEME):
     """Create a radar chart of audio features."""
+    from features import summarize_features
+
     # Extract mean values for key features
-    mean_values = audio_features_df[['danceability', 'energy', 'valence', 
-                                     'acousticness', 'instrumentalness']].mean()
+    summary = summarize_features(audio_features_df, feature_summary)
+    values = summary.means(RADAR_FEATURES)
 
     # Create radar chart data
     categories = ['Danceability', 'Energy', 'Positivity', 'Acousticness', 'Instrumentalness']
-    values = mean_values.values.tolist()
-
-    # Create figure
-    fig = px.line_polar(
-        r=values,
-        theta=categories,
-        line_close=True,
-        range_r=[0, 1],
-        template="plotly_dark"
-    )
 
-    # Update layout and styling
-    fig.update_traces(
+    # Repeat the first point to close the outline
+    fig = go.Figure(go.Scatterpolar(
+        r=values + values[:1],
+        theta=categories + categories[:1],
+        mode='lines',
         fill='toself',
         fillcolor='rgba(255, 51, 102, 0.2)',
-        line=dict(color='rgba(255, 51, 102, 0.8)', width=2)
-    )
+        line=dict(color='rgba(255, 51, 102, 0.8)', width=2),
+        hovertemplate='<b>%{theta}</b><br>%{r:.2f}<extra></extra>'
+    ))
 
     fig.update_layout(
+        template=theme or 'none',
         polar=dict(
             radialaxis=dict(
                 visible=True,
@@ -83,40 +148,25 @@ def create_audio_features_radar(audio_features_df):
 
     return fig
 
-def create_genre_bar_chart(genres):
+def create_genre_bar_chart(genres, theme=CHART_THEME):
     """Create a bar chart of top genres."""
     # Handle empty data
     if not genres:
         genres = [("No genre data", 0)]
 
-    # Limit to top 8 genres
-    genres = genres[:8]
+    # Limit to top 8 genres, largest at the top
+    genres = sorted(genres[:8], key=lambda genre: genre[1])
 
-    # Create dataframe
-    df = pd.DataFrame({
-        'genre': [genre[0] for genre in genres],
-        'count': [genre[1] for genre in genres]
-    })
-
-    # Sort by count
-    df = df.sort_values('count', ascending=True)
-
-    # Create bar chart
-    fig = px.bar(
-        df,
-        y='genre',
-        x='count',
+    fig = go.Figure(go.Bar(
+        x=[genre[1] for genre in genres],
+        y=[genre[0] for genre in genres],
         orientation='h',
-        template="plotly_dark"
-    )
-
-    # Update layout and styling
-    fig.update_traces(
         marker_color='rgba(255, 51, 102, 0.7)',
         hovertemplate='<b>%{y}</b><br>Count: %{x}<extra></extra>'
-    )
+    ))
 
     fig.update_layout(
+        template=theme or 'none',
         paper_bgcolor='rgba(0, 0, 0, 0)',
         plot_bgcolor='rgba(0, 0, 0, 0)',
         title="Your Top Genres",
@@ -131,64 +181,45 @@ def create_genre_bar_chart(genres):
 
     return fig
 
-def create_listening_time_chart(recent_tracks):
+def create_listening_time_chart(recent_tracks, timeline=None, theme=CHART_THEME):
     """Create a chart showing listening patterns by hour of day."""
     try:
-        # Extract timestamps and convert to datetime
+        hours = np.arange(24)
         if not recent_tracks:
-            # Create simulated data if no data available
-            hours = list(range(24))
-            counts = np.random.randint(0, 10, size=24)
-            df = pd.DataFrame({'hour': hours, 'count': counts})
+            # Placeholder data if no data available; it's seeded because the
+            # finished chart is cached
+            counts = np.random.default_rng(0).integers(0, 10, size=24)
         else:
-            timestamps = [item['played_at'] for item in recent_tracks['items']]
-            # Convert timestamps to datetime objects
-            datetimes = [datetime.fromisoformat(ts.replace('Z', '+00:00')) 
-                         if 'Z' in ts else datetime.fromisoformat(ts) 
-                         for ts in timestamps]
-
-            # Extract hour of day
-            hours = [dt.hour for dt in datetimes]
-
-            # Count tracks by hour
-            hour_counts = {}
-            for hour in range(24):
-                hour_counts[hour] = hours.count(hour)
-
-            # Convert to dataframe
-            df = pd.DataFrame({
-                'hour': list(hour_counts.keys()),
-                'count': list(hour_counts.values())
-            })
+            # Count tracks by hour from the parsed play times
+            if timeline is None:
+                from timeline import ListeningTimeline
+                timeline = ListeningTimeline.from_recent_tracks(recent_tracks)
+            counts = timeline.hour_counts()
 
         # Create time labels (12 AM, 1 AM, etc.)
         time_labels = [f"{h%12 or 12} {'AM' if h<12 else 'PM'}" for h in range(24)]
-        df['time_label'] = [time_labels[hour] for hour in df['hour']]
-
-        # Create the line chart
-        fig = px.line(
-            df,
-            x='hour',
-            y='count',
-            markers=True,
-            template="plotly_dark"
-        )
 
-        # Update layout and styling
-        fig.update_traces(
+        # The line's own fill gives the subtle area under it
+        fig = go.Figure(go.Scatter(
+            x=hours,
+            y=counts,
+            mode='lines+markers',
+            fill='tozeroy',
+            fillcolor='rgba(255, 51, 102, 0.1)',
             line=dict(color='rgba(255, 51, 102, 0.8)', width=3),
             marker=dict(size=8, color='rgba(255, 204, 0, 0.8)'),
+            customdata=time_labels,
             hovertemplate='<b>%{customdata}</b><br>Tracks: %{y}<extra></extra>'
-        )
-
-        fig.update_traces(customdata=df['time_label'])
+        ))
 
         fig.update_layout(
+            template=theme or 'none',
             paper_bgcolor='rgba(0, 0, 0, 0)',
             plot_bgcolor='rgba(0, 0, 0, 0)',
             title="When You Listen",
             title_font=dict(size=20),
             title_x=0.5,
+            showlegend=False,
             xaxis_title=None,
             yaxis_title="Tracks played",
             xaxis=dict(
@@ -201,21 +232,147 @@ def create_listening_time_chart(recent_tracks):
             margin=dict(l=20, r=20, t=60, b=40)
         )
 
-        # Add a subtle area fill under the line
-        fig.add_scatter(
-            x=df['hour'],
-            y=df['count'],
-            mode='none',
-            fill='tozeroy',
-            fillcolor='rgba(255, 51, 102, 0.1)',
-            showlegend=False
-        )
-
         return fig
     except Exception as e:
         # Return a simple placeholder chart if there's an error
         hours = list(range(24))
-        counts = np.random.randint(1, 5, size=24)
-        fig = px.line(x=hours, y=counts, template="plotly_dark")
-        fig.update_layout(title="Listening Patterns (Demo)")
-        return fig
\ No newline at end of file
+        counts = np.random.default_rng(0).integers(1, 5, size=24)
+        fig = go.Figure(go.Scatter(x=hours, y=counts, mode='lines'))
+        fig.update_layout(template=theme or 'none', title="Listening Patterns (Demo)")
+        return fig
+
+def create_listening_heatmap(chart_data, theme=CHART_THEME):
+    """Create a heatmap of plays by weekday and hour of day."""
+    time_labels = [f"{h%12 or 12} {'AM' if h<12 else 'PM'}" for h in range(24)]
+    days = list(calendar.day_abbr)
+
+    fig = go.Figure(go.Heatmap(
+        z=chart_data['hour_weekday_counts'],
+        x=time_labels,
+        y=days,
+        colorscale=[[0, 'rgba(255, 51, 102, 0.05)'], [1, 'rgba(255, 51, 102, 0.9)']],
+        showscale=False,
+        xgap=2,
+        ygap=2,
+        hovertemplate='<b>%{y} %{x}</b><br>Tracks: %{z}<extra></extra>'
+    ))
+
+    fig.update_layout(
+        template=theme or 'none',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        title="Your Listening Week",
+        title_font=dict(size=20),
+        title_x=0.5,
+        xaxis=dict(showgrid=False, tickmode='array', tickvals=time_labels[::3]),
+        yaxis=dict(showgrid=False, autorange='reversed'),
+        margin=dict(l=20, r=20, t=60, b=40)
+    )
+
+    return fig
+
+def create_play_history_chart(chart_data, theme=CHART_THEME):
+    """Create a chart of plays per day with the weekly average."""
+    fig = go.Figure([
+        go.Scatter(
+            x=chart_data['daily_dates'],
+            y=chart_data['daily_counts'],
+            mode='lines',
+            name='Per day',
+            line=dict(color='rgba(255, 51, 102, 0.8)', width=2),
+            hovertemplate='<b>%{x|%b %d, %Y}</b><br>Tracks: %{y}<extra></extra>'
+        ),
+        go.Scatter(
+            x=chart_data['weekly_dates'],
+            y=chart_data['weekly_counts'] / 7,
+            mode='lines',
+            name='Weekly average',
+            line=dict(color='rgba(255, 204, 0, 0.8)', width=2, shape='hv', dash='dot'),
+            hovertemplate='<b>Week of %{x|%b %d, %Y}</b><br>Tracks per day: %{y:.1f}<extra></extra>'
+        )
+    ])
+
+    fig.update_layout(
+        template=theme or 'none',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        title="Your Listening Over Time",
+        title_font=dict(size=20),
+        title_x=0.5,
+        yaxis_title="Tracks played",
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=False),
+        legend=dict(orientation='h', y=-0.15, x=0.5, xanchor='center'),
+        margin=dict(l=20, r=20, t=60, b=40)
+    )
+
+    return fig
+
+def create_mood_trend_chart(chart_data, theme=CHART_THEME):
+    """Create a chart of rolling averages of audio features over the listening history."""
+    colors = ['rgba(255, 51, 102, 0.8)', 'rgba(255, 204, 0, 0.8)', 'rgba(51, 204, 255, 0.8)']
+    labels = {'valence': 'Positivity', 'energy': 'Energy', 'danceability': 'Danceability'}
+
+    fig = go.Figure([
+        go.Scatter(
+            x=chart_data['trend_dates'],
+            y=chart_data['trend_values'][:, i],
+            mode='lines',
+            name=labels.get(feature, feature.title()),
+            line=dict(color=colors[i % len(colors)], width=2),
+            hovertemplate=f"<b>%{{x|%b %d, %Y}}</b><br>{labels.get(feature, feature.title())}: %{{y:.2f}}<extra></extra>"
+        )
+        for i, feature in enumerate(chart_data['trend_features'])
+    ])
+
+    fig.update_layout(
+        template=theme or 'none',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        title="Your Mood Over Time",
+        title_font=dict(size=20),
+        title_x=0.5,
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=False, range=[0, 1]),
+        legend=dict(orientation='h', y=-0.15, x=0.5, xanchor='center'),
+        margin=dict(l=20, r=20, t=60, b=40)
+    )
+
+    return fig
+
+# Finished figures are cached as the JSON st.plotly_chart would send, keyed
+# on just the values each chart draws, so hits skip building and encoding.
+# Charts are built without a theme and get its template at serialization.
+
+def radar_key(audio_features_df, feature_summary=None, theme=CHART_THEME):
+    from features import summarize_features
+    return summarize_features(audio_features_df, feature_summary).means(RADAR_FEATURES), theme
+
+def listening_time_key(recent_tracks, timeline=None, theme=CHART_THEME):
+    if recent_tracks and timeline is not None:
+        return timeline.hour_counts(), theme
+    return recent_tracks, theme
+
+@memoize(disk=True, key=radar_key, version=CHART_VERSION)
+def audio_features_radar_spec(audio_features_df, feature_summary=None, theme=CHART_THEME):
+    return figure_json(create_audio_features_radar(audio_features_df, feature_summary, None), theme)
+
+@memoize(disk=True, version=CHART_VERSION)
+def genre_bar_chart_spec(genres, theme=CHART_THEME):
+    return figure_json(create_genre_bar_chart(genres, None), theme)
+
+@memoize(disk=True, key=listening_time_key, version=CHART_VERSION)
+def listening_time_chart_spec(recent_tracks, timeline=None, theme=CHART_THEME):
+    return figure_json(create_listening_time_chart(recent_tracks, timeline, None), theme)
+
+@memoize(disk=True, version=CHART_VERSION)
+def listening_heatmap_spec(chart_data, theme=CHART_THEME):
+    return figure_json(create_listening_heatmap(chart_data, None), theme)
+
+@memoize(disk=True, version=CHART_VERSION)
+def play_history_chart_spec(chart_data, theme=CHART_THEME):
+    return figure_json(create_play_history_chart(chart_data, None), theme)
+
+@memoize(disk=True, version=CHART_VERSION)
+def mood_trend_chart_spec(chart_data, theme=CHART_THEME):
+    return figure_json(create_mood_trend_chart(chart_data, None), theme)